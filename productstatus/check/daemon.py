@@ -0,0 +1,318 @@
+"""!
+@brief Long-running evaluation of product checks.
+
+The check daemon keeps the result of every check in memory. It wakes up when
+resources are saved, either from the notifications sent along with pending
+messages, or from the Kafka topic, and re-evaluates only the checks of
+products having new or modified product instances or data instances. Checks
+whose result can change by the passing of time are evaluated again when their
+next transition is due. All checks are evaluated again at a fixed interval,
+which picks up changes to the checks themselves. Only results differing from
+the previous result of a check are reported.
+"""
+
+from django.conf import settings
+
+import django.db.models
+
+import datetime
+import json
+import logging
+import ssl
+import timeit
+import uuid
+
+import kafka
+
+import productstatus
+import productstatus.check.evaluator
+import productstatus.check.models
+import productstatus.check.scheduler
+import productstatus.core.models
+import productstatus.core.notify
+
+
+# Resources whose changes can alter the result of a check
+CHECKED_RESOURCES = ('product', 'productinstance', 'data', 'datainstance',)
+
+# Objects are saved some time before their transaction commits, on servers
+# whose clocks may differ. Changes are looked up this many seconds before the
+# latest modification time seen, so that late commits are not missed.
+CHANGE_LOOKUP_OVERLAP = 10
+
+# Models whose changes can alter the result of a check, with the lookup of
+# their product
+TRACKED_MODELS = (
+    (productstatus.core.models.ProductInstance, 'product_id'),
+    (productstatus.core.models.DataInstance, 'data__product_instance__product_id'),
+)
+
+# Lookup of the product of each resource in CHECKED_RESOURCES
+RESOURCE_PRODUCT_LOOKUPS = {
+    'product': (productstatus.core.models.Product, 'id'),
+    'productinstance': (productstatus.core.models.ProductInstance, 'product_id'),
+    'data': (productstatus.core.models.Data, 'product_instance__product_id'),
+    'datainstance': (productstatus.core.models.DataInstance, 'data__product_instance__product_id'),
+}
+
+
+class ChangeTracker(object):
+    """!
+    @brief Find the products having product instances or data instances
+    modified since the previous lookup.
+
+    Lookups start at the latest modification time found in the database,
+    using the indexes on the modified columns, so that changes saved by
+    servers whose clocks are behind the daemon's clock are not missed. The
+    starting point never moves past the daemon's clock, so that changes saved
+    by servers whose clocks are ahead do not hide the changes of other
+    servers. Objects found within the overlap are remembered along with their
+    modification time, so that each change is only reported once.
+    """
+
+    def __init__(self):
+        self.since = None
+        self.seen = {}
+
+    def latest_modification(self):
+        """!
+        @brief Return the latest modification time of any tracked object.
+        """
+        times = [model.objects.aggregate(latest=django.db.models.Max('modified'))['latest'] for model, field in TRACKED_MODELS]
+        times = [x for x in times if x is not None]
+        if not times:
+            return productstatus.coerce_to_utc(datetime.datetime(1970, 1, 1))
+        return max(times)
+
+    def changed_products(self, resources=[]):
+        """!
+        @brief Return a set of ids of products having modified product
+        instances or data instances. The first lookup only finds the starting
+        point of the next lookup, and returns an empty set.
+        @param resources List of (resource, id) tuples of resources known to
+        have changed, e.g. from the messages of the Kafka topic.
+        """
+        first = self.since is None
+        if first:
+            self.since = self.latest_modification()
+        start = self.since - datetime.timedelta(seconds=CHANGE_LOOKUP_OVERLAP)
+        ids = set()
+        seen = {}
+        for model, field in TRACKED_MODELS:
+            rows = model.objects.filter(modified__gte=start).values_list('id', 'modified', field)
+            for id, modified, product_id in rows:
+                seen[id] = modified
+                if self.seen.get(id) != modified:
+                    ids.add(product_id)
+                self.since = max(self.since, modified)
+        self.since = min(self.since, productstatus.now_with_timezone())
+        self.seen = seen
+        if first:
+            return set()
+        return ids | self.resource_products(resources)
+
+    @staticmethod
+    def resource_products(resources):
+        """!
+        @brief Return a set of ids of the products of (resource, id) tuples.
+        """
+        ids = set()
+        for name, (model, field) in RESOURCE_PRODUCT_LOOKUPS.items():
+            resource_ids = [id for resource, id in resources if resource == name]
+            if resource_ids:
+                ids |= set(model.objects.filter(id__in=resource_ids).values_list(field, flat=True))
+        return ids
+
+
+class DatabaseEventWaiter(object):
+    """!
+    @brief Wait for pending messages to be added, using the notifications of
+    the publisher on PostgreSQL, or polling on other databases.
+    """
+
+    def __init__(self):
+        self.waiter = productstatus.core.notify.PendingMessageWaiter()
+
+    def wait(self, activity, timeout):
+        self.waiter.wait(activity, timeout)
+
+    def pop_resources(self):
+        """!
+        @brief Notifications do not identify the changed resources.
+        """
+        return []
+
+
+class KafkaEventWaiter(object):
+    """!
+    @brief Wait for messages about resources that can alter check results on
+    the Kafka topic.
+    """
+
+    def __init__(self):
+        ssl_context = ssl.create_default_context()
+        ssl_context.protocol = ssl.PROTOCOL_TLSv1_2
+        if not settings.KAFKA_SSL_VERIFY:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        self.consumer = kafka.KafkaConsumer(settings.KAFKA_TOPIC,
+                                            bootstrap_servers=settings.KAFKA_BROKERS,
+                                            client_id=settings.KAFKA_CLIENT_ID,
+                                            auto_offset_reset='latest',
+                                            enable_auto_commit=False,
+                                            security_protocol='SSL' if settings.KAFKA_SSL else 'PLAINTEXT',
+                                            ssl_context=ssl_context)
+        self.resources = []
+
+    @staticmethod
+    def relevant_resource(value):
+        """!
+        @brief Return the (resource, id) tuple of a message about a resource
+        that can alter check results, or None.
+        """
+        try:
+            message = json.loads(value.decode('utf-8'))
+        except (ValueError, UnicodeError):
+            return None
+        if not isinstance(message, dict) or message.get('type') != 'resource':
+            return None
+        if message.get('resource') not in CHECKED_RESOURCES:
+            return None
+        try:
+            return (message['resource'], uuid.UUID(str(message.get('id'))),)
+        except ValueError:
+            return None
+
+    def wait(self, activity, timeout):
+        """!
+        @brief Consume messages until a relevant message arrives, or the
+        timeout is reached. The resources of the relevant messages are kept
+        until they are popped.
+        """
+        deadline = timeit.default_timer() + max(0, timeout)
+        while True:
+            remaining = deadline - timeit.default_timer()
+            if remaining <= 0:
+                return
+            records = self.consumer.poll(timeout_ms=int(remaining * 1000))
+            resources = [self.relevant_resource(record.value) for partition_records in records.values() for record in partition_records]
+            resources = [x for x in resources if x is not None]
+            if resources:
+                self.resources += resources
+                return
+
+    def pop_resources(self):
+        """!
+        @brief Return and forget the (resource, id) tuples of the relevant
+        messages consumed so far.
+        """
+        resources, self.resources = self.resources, []
+        return resources
+
+
+class CheckDaemon(object):
+    """!
+    @brief Evaluate checks when the data they depend on changes, and report
+    the results that changed since the previous evaluation.
+    """
+
+    def __init__(self, report, waiter, refresh_interval):
+        """!
+        @param report Function called with each changed check result.
+        @param waiter Object whose wait(activity, timeout) method blocks until
+        resources might have changed, and whose pop_resources() method returns
+        the (resource, id) tuples of the resources known to have changed.
+        @param refresh_interval Number of seconds between evaluations of all
+        checks.
+        """
+        self.report = report
+        self.waiter = waiter
+        self.refresh_interval = refresh_interval
+        self.tracker = ChangeTracker()
+        self.scheduler = productstatus.check.scheduler.DeadlineScheduler()
+        self.codes = {}
+        self.next_refresh_time = 0
+
+    def pop_resources(self):
+        """!
+        @brief Return the (resource, id) tuples of the resources that the
+        waiter knows to have changed.
+        """
+        if self.waiter is None:
+            return []
+        return self.waiter.pop_resources()
+
+    def evaluate(self, queryset):
+        """!
+        @brief Evaluate the checks in the queryset, report the results whose
+        code differs from the previous result of the same check, and schedule
+        their next transitions. A result that fails to be reported is reported
+        again on the next evaluation of the check.
+        @returns The evaluated checks.
+        """
+        checks = list(productstatus.check.models.Check.with_conditions(queryset))
+        evaluator = productstatus.check.evaluator.BatchEvaluator(checks)
+        for check in checks:
+            result = evaluator.execute(check)
+            result.check = check
+            self.scheduler.schedule(check.pk, check.next_transition(evaluator))
+            code = result.get_code()
+            if self.codes.get(check.pk) == code:
+                continue
+            try:
+                self.report(result)
+            except Exception:
+                logging.exception('Failed to report the result of check %s', check.name)
+                continue
+            self.codes[check.pk] = code
+        return checks
+
+    def refresh(self):
+        """!
+        @brief Evaluate all checks, and forget the results of deleted checks.
+        """
+        self.next_refresh_time = timeit.default_timer() + self.refresh_interval
+        self.tracker.changed_products(self.pop_resources())
+        checks = self.evaluate(productstatus.check.models.Check.objects.all())
+        ids = set([check.pk for check in checks])
+        self.codes = dict([(id, code) for id, code in self.codes.items() if id in ids])
+        [self.scheduler.cancel(id) for id in self.scheduler.keys() if id not in ids]
+
+    def step(self):
+        """!
+        @brief Evaluate all checks if the refresh interval has passed, and
+        otherwise the checks of products that have changed, and the checks
+        whose next transition is due.
+        @returns True if any checks were evaluated.
+        """
+        if timeit.default_timer() >= self.next_refresh_time:
+            self.refresh()
+            return True
+        products = self.tracker.changed_products(self.pop_resources())
+        due = self.scheduler.pop_due(productstatus.now_with_timezone())
+        if not products and not due:
+            return False
+        logging.debug('Evaluating checks of %d changed products, and %d checks with due transitions', len(products), len(due))
+        self.evaluate(productstatus.check.models.Check.objects.filter(
+            django.db.models.Q(product_id__in=products) | django.db.models.Q(id__in=due)
+        ))
+        return True
+
+    def timeout(self):
+        """!
+        @brief Return the number of seconds until the next transition is due,
+        or until the next evaluation of all checks.
+        """
+        timeout = self.next_refresh_time - timeit.default_timer()
+        deadline = self.scheduler.next_deadline()
+        if deadline is not None:
+            timeout = min(timeout, (deadline - productstatus.now_with_timezone()).total_seconds())
+        return max(0, timeout)
+
+    def run(self):
+        """!
+        @brief Evaluate checks until the process exits.
+        """
+        while True:
+            activity = self.step()
+            self.waiter.wait(activity, self.timeout())
@@ -0,0 +1,93 @@
+"""!
+@brief Batch evaluation of product checks.
+
+Check conditions belonging to the same product look up the same latest
+product instance, and count data instances on it. The batch evaluator fetches
+the latest product instance of every product, and the number of data
+instances grouped by product instance, service backend and data format, for
+all checks at once. The conditions are then evaluated from these tables.
+"""
+
+from django.db.models import Count
+
+import productstatus.core.models
+
+
+class BatchEvaluator(object):
+    """!
+    @brief Evaluator answering the lookups of check conditions from tables
+    loaded for a set of checks.
+    """
+
+    def __init__(self, checks):
+        self.conditions = {}
+        self.latest_instances = {}
+        self.counts = {}
+        self.counted_instances = set()
+        self.load(checks)
+
+    def load(self, checks):
+        """!
+        @brief Load the conditions of the checks, the latest product instance
+        of their products, and the data instance counts of those product
+        instances.
+        """
+        for check in checks:
+            self.conditions[check.pk] = check.checks()
+
+        # Products already loaded along with the checks are reused.
+        products = {}
+        for check in checks:
+            if hasattr(check, check._meta.get_field('product').get_cache_name()):
+                products[check.product_id] = check.product
+        missing = set([check.product_id for check in checks]) - set(products.keys())
+        if missing:
+            queryset = productstatus.core.models.Product.objects.filter(id__in=missing).select_related('latest_instance')
+            products.update([(product.id, product) for product in queryset])
+        for check in checks:
+            check.product = products[check.product_id]
+        for product in products.values():
+            self.latest_instances[product.id] = product.latest_product_instance()
+
+        self.counted_instances = set([x.id for x in self.latest_instances.values() if x is not None])
+        counts = productstatus.core.models.DataInstance.objects.filter(
+            data__product_instance_id__in=self.counted_instances,
+            deleted=False,
+        ).values(
+            'data__product_instance_id', 'service_backend_id', 'format_id',
+        ).annotate(count=Count('id')).order_by()
+        for row in counts:
+            key = (row['data__product_instance_id'], row['service_backend_id'], row['format_id'],)
+            self.counts[key] = row['count']
+
+    def get_conditions(self, check):
+        """!
+        @brief Return the conditions of a check.
+        """
+        if check.pk not in self.conditions:
+            self.conditions[check.pk] = check.checks()
+        return self.conditions[check.pk]
+
+    def latest_product_instance(self, product):
+        """!
+        @brief Return the latest ProductInstance of a product, or None if it
+        has no product instances.
+        """
+        if product.id not in self.latest_instances:
+            return product.latest_product_instance()
+        return self.latest_instances[product.id]
+
+    def data_instance_count(self, product_instance, format, service_backend):
+        """!
+        @brief Return the number of data instances of a product instance
+        having the specified data format and service backend.
+        """
+        if product_instance.id not in self.counted_instances:
+            return product_instance.data_instances_with_data_format_on_service_backend(format, service_backend).count()
+        return self.counts.get((product_instance.id, service_backend.id, format.id,), 0)
+
+    def execute(self, check):
+        """!
+        @brief Run a check and return its results as a CheckResult object.
+        """
+        return check.execute(evaluator=self)
@@ -4,21 +4,73 @@ from django.db import connection
 
 import sys
 import json
+import queue
 import socket
 import requests
 import logging
+import threading
 
 import django.db.utils
 
 import productstatus.core.models
 import productstatus.check
+import productstatus.check.daemon
+import productstatus.check.evaluator
 import productstatus.check.models
+import productstatus.check.scheduler
 
 
 class UnknownCheckException(Exception):
     pass
 
 
+def execute_check(check, evaluator=None):
+    result = check.execute(evaluator=evaluator)
+    result.check = check
+    return result
+
+
+def execute_checks(checks, jobs=1, evaluator=None):
+    """!
+    @brief Execute checks using the specified number of worker threads, each
+    with its own database connection.
+    @returns A list of check results, in the same order as the checks.
+    """
+    if jobs <= 1:
+        return [execute_check(check, evaluator) for check in checks]
+
+    tasks = queue.Queue()
+    for task in enumerate(checks):
+        tasks.put(task)
+    results = [None] * len(checks)
+    exceptions = [None] * len(checks)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    index, check = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = execute_check(check, evaluator)
+                except Exception as e:
+                    exceptions[index] = e
+        finally:
+            django.db.connection.close()
+
+    threads = [threading.Thread(target=worker) for i in range(min(jobs, len(checks)))]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    # Fail like a serial run would, on the first check raising an exception
+    for exception in exceptions:
+        if exception is not None:
+            raise exception
+
+    return results
+
+
 class Printer(object):
     def format(self, result):
         raise NotImplementedError('Please implement the "format" command.')
@@ -137,6 +189,13 @@ class Command(BaseCommand):
         parser.add_argument('--sensu', action='store_true', required=False, help='Send check output to a local Sensu client instead of stdout')
         parser.add_argument('--sensu-handlers', nargs='*', metavar='HANDLER', help='Define which Sensu handlers to add to check outputs')
         parser.add_argument('--pagerduty', action='store_true', required=False, help='Enable PagerDuty output')
+        parser.add_argument('--jobs', type=int, default=1, metavar='N', help='Number of checks to execute concurrently')
+        parser.add_argument('--upcoming', action='store_true', required=False, help='List the times at which check results will change unless new data arrives')
+        parser.add_argument('--daemon', action='store_true', required=False, help='Keep running, and print check results whenever they change')
+        parser.add_argument('--events', choices=['database', 'kafka'], default='database',
+                            help='In daemon mode, wake up on database notifications or on Kafka messages')
+        parser.add_argument('--refresh-interval', type=float, default=settings.CHECK_DAEMON_REFRESH_INTERVAL,
+                            help='In daemon mode, number of seconds between evaluations of all checks')
         parser.add_argument('--ignore-read-only', action='store_true', required=False, help='Suppress check output if the database is read-only')
 
     def read_only(self):
@@ -155,31 +214,67 @@ class Command(BaseCommand):
         for check in checks:
             print(check.name)
 
+    def print_upcoming_transitions(self):
+        checks = list(productstatus.check.models.Check.with_conditions())
+        evaluator = productstatus.check.evaluator.BatchEvaluator(checks)
+        scheduler = productstatus.check.scheduler.DeadlineScheduler()
+        names = {}
+        for check in checks:
+            names[check.pk] = check.name
+            scheduler.schedule(check.pk, check.next_transition(evaluator))
+        for deadline, id in scheduler.upcoming():
+            print('%s %s' % (deadline.strftime('%Y-%m-%dT%H:%M:%SZ'), names[id]))
+
+    def run_daemon(self, options):
+        if options['sensu'] is True:
+            printer = SensuPrinter(handlers=options['sensu_handlers'])
+        elif options['pagerduty'] is True:
+            printer = PagerDutyPrinter()
+        else:
+            printer = MultiStdoutPrinter()
+
+        def report(result):
+            if options['ignore_read_only'] and self.read_only():
+                return
+            printer.print(result)
+            sys.stdout.flush()
+
+        if options['events'] == 'kafka':
+            waiter = productstatus.check.daemon.KafkaEventWaiter()
+        else:
+            waiter = productstatus.check.daemon.DatabaseEventWaiter()
+        daemon = productstatus.check.daemon.CheckDaemon(report, waiter, options['refresh_interval'])
+        daemon.run()
+
     def handle(self, *args, **options):
         if options['list'] is True:
             self.print_check_list()
             sys.exit(0)
 
+        if options['upcoming'] is True:
+            self.print_upcoming_transitions()
+            sys.exit(0)
+
+        if options['daemon'] is True:
+            self.run_daemon(options)
+            return
+
         # Collect check results
         try:
             if options['check_name']:
                 try:
                     printer = StdoutPrinter()
-                    check = productstatus.check.models.Check.objects.get(name=options['check_name'])
+                    check = productstatus.check.models.Check.with_conditions().get(name=options['check_name'])
                     results = [check.execute()]
                     num_checks = 1
                 except:
                     raise UnknownCheckException('Check not found: %s' % options['check_name'])
             else:
-                num_checks = 0
                 printer = MultiStdoutPrinter()
-                objects = list(productstatus.check.models.Check.objects.all())
-                results = []
-                for check in objects:
-                    result = check.execute()
-                    result.check = check
-                    results += [result]
-                    num_checks += 1
+                objects = list(productstatus.check.models.Check.with_conditions())
+                evaluator = productstatus.check.evaluator.BatchEvaluator(objects)
+                results = execute_checks(objects, options['jobs'], evaluator)
+                num_checks = len(results)
 
         except UnknownCheckException as e:
             results = [productstatus.check.SimpleCheckResult(productstatus.check.UNKNOWN, str(e))]
@@ -29,15 +29,52 @@ class Check(models.Model):
     pagerduty_incident = models.CharField("PagerDuty incident key",
                                          unique=True, max_length=255, null=True, blank=True)
 
-    def execute(self):
+    def execute(self, evaluator=None):
         """!
         @brief Run a check and return its results as a CheckResult object.
+        @param evaluator A BatchEvaluator loaded with this check, or None to
+        look up everything from the database.
         """
         result = productstatus.check.CheckResult()
         result.set_max_severity(productstatus.check.get_severity_by_code(self.max_severity))
-        [result.add_part(x.execute()) for x in self.checks()]
+        if evaluator is None:
+            conditions = self.checks()
+        else:
+            conditions = evaluator.get_conditions(self)
+        [result.add_part(x.execute(evaluator)) for x in conditions]
         return result
 
+    @classmethod
+    def with_conditions(cls, queryset=None):
+        """!
+        @brief Return a QuerySet of checks loading their product, and the
+        conditions of all checks along with the objects they refer to, using
+        one query per condition type.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        prefetches = []
+        for relation in cls._meta.related_objects:
+            model = relation.related_model
+            related_fields = [field.name for field in model._meta.get_fields()
+                              if field.many_to_one and field.name != relation.field.name]
+            prefetches += [models.Prefetch(relation.get_accessor_name(),
+                                           queryset=model.objects.select_related(*related_fields))]
+        return queryset.select_related('product__latest_instance').prefetch_related(*prefetches)
+
+    def next_transition(self, evaluator=None):
+        """!
+        @brief Return the earliest time at which the result of this check can
+        change by the passing of time alone, or None if it cannot.
+        """
+        if evaluator is None:
+            conditions = self.checks()
+        else:
+            conditions = evaluator.get_conditions(self)
+        transitions = [x.next_transition(evaluator) for x in conditions]
+        transitions = [x for x in transitions if x is not None]
+        return min(transitions) if transitions else None
+
     def checks(self):
         c = []
         for check in self._meta.related_objects:
@@ -62,21 +99,37 @@ class CheckCondition(models.Model):
     def severity_object(self):
         return productstatus.check.get_severity_by_code(self.severity)
 
-    def execute(self):
+    def execute(self, evaluator=None):
         """!
         @brief Return a check condition result.
         @returns productstatus.check.CheckResultPart
         """
         result = productstatus.check.CheckResultPart()
-        self.run_check(result)
+        self.run_check(result, evaluator)
         return result
 
-    def run_check(self, result):
+    def latest_product_instance(self, evaluator=None):
+        """!
+        @brief Return the latest ProductInstance of the checked product.
+        """
+        if evaluator is None:
+            return self.check_id.product.latest_product_instance()
+        return evaluator.latest_product_instance(self.check_id.product)
+
+    def run_check(self, result, evaluator=None):
         """!
         @brief Populate a check condition result with check data.
         """
         raise NotImplementedError('Please implement the "run_check" function in your CheckCondition subclass.')
 
+    def next_transition(self, evaluator=None):
+        """!
+        @brief Return the time at which the result of this condition changes
+        if no data is added or modified in the meantime, or None if the
+        result does not depend on the time.
+        """
+        return None
+
 
 class CheckConditionDataInstance(CheckCondition):
     service_backend = models.ForeignKey(productstatus.core.models.ServiceBackend, help_text='Required ServiceBackend')
@@ -106,22 +159,53 @@ class CheckConditionDataInstance(CheckCondition):
             return True
         return reference_time.hour in self.terms_list()
 
-    def run_check(self, result):
+    def data_instance_count(self, product_instance, evaluator=None):
+        """!
+        @brief Return the number of DataInstances on a ProductInstance, with
+        matching ServiceBackend and DataFormat.
+        """
+        if evaluator is None:
+            return product_instance.data_instances_with_data_format_on_service_backend(self.format, self.service_backend).count()
+        return evaluator.data_instance_count(product_instance, self.format, self.service_backend)
+
+    def deadline(self, product_instance):
+        """!
+        @brief Return the time at which the grace time of a ProductInstance
+        runs out.
+        """
+        return product_instance.reference_time + datetime.timedelta(minutes=self.grace_time)
+
+    def next_transition(self, evaluator=None):
+        """!
+        @brief Return the end of the grace time of the latest ProductInstance,
+        if it has not passed yet, and the required number of DataInstances is
+        not present.
+        """
+        product_instance = self.latest_product_instance(evaluator)
+        if not product_instance or not self.reference_time_in_terms(product_instance.reference_time):
+            return None
+        deadline = self.deadline(product_instance)
+        if deadline <= productstatus.now_with_timezone():
+            return None
+        if self.data_instance_count(product_instance, evaluator) == self.count:
+            return None
+        return deadline
+
+    def run_check(self, result, evaluator=None):
         """!
         @brief Check that a certain number of DataInstances exists on the
         latest ProductInstance, with matching ServiceBackend and DataFormat.
         """
-        product_instance = self.check_id.product.latest_product_instance()
+        product_instance = self.latest_product_instance(evaluator)
         if not product_instance:
             return result.set_result(self.severity_object, 'No product instances found for product %s' % self.check_id.product.name)
         base_text = '%s %s files on %s' % (self.check_id.product.name, self.format.name, self.service_backend.name)
         if not self.reference_time_in_terms(product_instance.reference_time):
             return result.ok('%s: skipping subcheck, not defined for term %02d' % (base_text, product_instance.reference_time.hour))
-        time_delta = datetime.timedelta(minutes=self.grace_time)
         now = productstatus.now_with_timezone()
-        remaining = (product_instance.reference_time + time_delta) - now
+        remaining = self.deadline(product_instance) - now
         remaining_seconds = remaining.total_seconds()
-        data_instance_count = product_instance.data_instances_with_data_format_on_service_backend(self.format, self.service_backend).count()
+        data_instance_count = self.data_instance_count(product_instance, evaluator)
         data_instance_delta = self.count - data_instance_count
         if data_instance_delta != 0:
             if data_instance_delta > 0:
@@ -140,18 +224,37 @@ class CheckConditionDataInstance(CheckCondition):
 class CheckConditionAge(CheckCondition):
     maximum_age = models.IntegerField("Maximum age of the current reference time, in minutes")
 
-    def run_check(self, result):
+    def deadline(self, product_instance):
+        """!
+        @brief Return the time at which the reference time of a
+        ProductInstance becomes too old.
+        """
+        return product_instance.reference_time + datetime.timedelta(minutes=self.maximum_age)
+
+    def next_transition(self, evaluator=None):
+        """!
+        @brief Return the time at which the reference time of the latest
+        ProductInstance becomes too old, if it has not passed yet.
+        """
+        product_instance = self.latest_product_instance(evaluator)
+        if not product_instance:
+            return None
+        deadline = self.deadline(product_instance)
+        if deadline <= productstatus.now_with_timezone():
+            return None
+        return deadline
+
+    def run_check(self, result, evaluator=None):
         """!
         @brief Check that the latest ProductInstance's reference time is more
         recent than the specified threshold.
         """
-        product_instance = self.check_id.product.latest_product_instance()
+        product_instance = self.latest_product_instance(evaluator)
         if not product_instance:
             result.set_result(self.severity_object, 'No product instances found for product %s' % self.check_id.product.name)
             return
-        time_delta = datetime.timedelta(minutes=self.maximum_age)
         now = productstatus.now_with_timezone()
-        remaining = (product_instance.reference_time + time_delta) - now
+        remaining = self.deadline(product_instance) - now
         remaining_seconds = remaining.total_seconds()
         if remaining_seconds > 0:
             result.ok('%s latest reference time is %s, still valid for %s' % (self.check_id.product.name, str(product_instance.reference_time), str(remaining)))
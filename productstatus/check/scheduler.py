@@ -0,0 +1,85 @@
+"""!
+@brief Scheduling of time-based check transitions.
+
+The result of a check can change without any new data, when the grace time of
+a data instance condition or the maximum age of an age condition runs out.
+The deadline scheduler keeps the next such transition of every check in a
+priority queue, so that a check is evaluated again exactly when its result can
+change, and not in between.
+"""
+
+import heapq
+import itertools
+
+
+class DeadlineScheduler(object):
+    """!
+    @brief Priority queue of deadlines, holding at most one deadline per key.
+
+    Rescheduling or cancelling a key leaves its previous entry in the heap,
+    where it is skipped when it reaches the top. The heap is rebuilt when it
+    holds too many such stale entries.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, key, deadline):
+        """!
+        @brief Set the deadline of a key, replacing any previous deadline. A
+        deadline of None cancels the key.
+        """
+        if deadline is None:
+            self.cancel(key)
+            return
+        entry = (deadline, next(self.counter), key)
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = list(self.entries.values())
+            heapq.heapify(self.heap)
+
+    def cancel(self, key):
+        self.entries.pop(key, None)
+
+    def keys(self):
+        return list(self.entries.keys())
+
+    def discard_stale(self):
+        while self.heap and self.entries.get(self.heap[0][2]) is not self.heap[0]:
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        """!
+        @brief Return the earliest deadline, or None if nothing is scheduled.
+        """
+        self.discard_stale()
+        if not self.heap:
+            return None
+        return self.heap[0][0]
+
+    def pop_due(self, now):
+        """!
+        @brief Remove and return the keys whose deadline is not later than
+        `now`, in deadline order.
+        """
+        keys = []
+        while True:
+            self.discard_stale()
+            if not self.heap or self.heap[0][0] > now:
+                return keys
+            deadline, count, key = heapq.heappop(self.heap)
+            del self.entries[key]
+            keys += [key]
+
+    def upcoming(self):
+        """!
+        @brief Return a list of (deadline, key) tuples for all scheduled keys,
+        in deadline order.
+        """
+        return [(entry[0], entry[2]) for entry in sorted(self.entries.values())]
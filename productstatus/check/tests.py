@@ -1,7 +1,17 @@
+import datetime
+import json
+import time
+import uuid
+
 import django.test
 
 import productstatus.check
+import productstatus.check.daemon
+import productstatus.check.evaluator
+import productstatus.check.management.commands.product_check
 import productstatus.check.models
+import productstatus.check.scheduler
+import productstatus.core.models
 
 
 class CheckTest(django.test.TestCase):
@@ -174,3 +184,293 @@ class CheckTest(django.test.TestCase):
         check_part.maximum_age = (delta.total_seconds() / 60) + 2
         result = check_part.execute()
         self.assertEqual(result.code, productstatus.check.OK)
+
+    def test_batch_evaluator(self):
+        """!
+        @brief Test that checks evaluated in a batch give the same results as
+        checks evaluated one by one, and that checks of the same product share
+        the lookups of its latest product instance and data instance counts.
+        """
+        check = productstatus.check.models.Check.objects.get(pk='8340969c-7f93-4527-8868-a23e3ed80d8b')
+        other = productstatus.check.models.Check.objects.create(name='test_check_2', product=check.product)
+        condition = check.checkconditiondatainstance_set.all()[0]
+        other.checkconditiondatainstance_set.create(service_backend=condition.service_backend,
+                                                    format=condition.format,
+                                                    count=2)
+        checks = list(productstatus.check.models.Check.objects.all().order_by('name'))
+        expected = [x.execute() for x in checks]
+
+        checks = list(productstatus.check.models.Check.objects.all().order_by('name'))
+        # Two queries for conditions of each check, one for the products and
+        # their latest instances, one for the latest instance of the product
+        # which has no latest_instance in the fixture, one for the data
+        # instance counts, and the data format and service backend of each
+        # data instance condition.
+        with self.assertNumQueries(13):
+            evaluator = productstatus.check.evaluator.BatchEvaluator(checks)
+            results = [evaluator.execute(x) for x in checks]
+        self.assertEqual([x.get_code() for x in results], [x.get_code() for x in expected])
+        self.assertEqual([len(x.get_parts()) for x in results], [3, 1])
+        self.assertEqual(results[1].get_message(), expected[1].get_message())
+
+    def test_with_conditions(self):
+        """!
+        @brief Test that checks are loaded with all their conditions using a
+        fixed number of queries, and evaluated in a batch without further
+        queries for the objects the conditions refer to.
+        """
+        check = productstatus.check.models.Check.objects.get(pk='8340969c-7f93-4527-8868-a23e3ed80d8b')
+        for i in range(5):
+            check.checkconditionage_set.create(maximum_age=600 + i)
+        expected = check.execute()
+
+        # One query for the checks and their products, one for each condition
+        # type, one for the latest instance of the product which has no
+        # latest_instance in the fixture, and one for the data instance counts.
+        with self.assertNumQueries(5):
+            checks = list(productstatus.check.models.Check.with_conditions())
+            evaluator = productstatus.check.evaluator.BatchEvaluator(checks)
+            results = [evaluator.execute(x) for x in checks]
+        self.assertEqual(len(results[0].get_parts()), 8)
+        self.assertEqual(results[0].get_code(), expected.get_code())
+
+    def test_daemon(self):
+        """!
+        @brief Test that the check daemon reports the result of each check
+        once, and again when new data changes its result.
+        """
+        check = productstatus.check.models.Check.objects.get(pk='8340969c-7f93-4527-8868-a23e3ed80d8b')
+        check.checkconditionage_set.all().delete()
+        check.checkconditiondatainstance_set.exclude(pk='032a366f-9bb9-4c98-aa27-97823ca9c7d1').delete()
+        condition = check.checkconditiondatainstance_set.get()
+        product_instance = check.product.latest_product_instance()
+        data_instance = product_instance.data_instances_with_data_format_on_service_backend(
+            condition.format, condition.service_backend).order_by()[0]
+
+        reported = []
+        daemon = productstatus.check.daemon.CheckDaemon(reported.append, None, 3600)
+        self.assertTrue(daemon.step())
+        self.assertEqual([x.get_code() for x in reported], [productstatus.check.OK])
+        self.assertEqual(reported[0].check.name, check.name)
+        self.assertFalse(daemon.step())
+
+        data_instance.deleted = True
+        data_instance.save()
+        self.assertTrue(daemon.step())
+        self.assertEqual([x.get_code() for x in reported], [productstatus.check.OK, productstatus.check.CRITICAL])
+
+        # Evaluating the same result again reports nothing
+        daemon.step()
+        self.assertEqual(len(reported), 2)
+
+    def test_daemon_report_failure(self):
+        """!
+        @brief Test that the check daemon reports a result again if reporting
+        it failed.
+        """
+        calls = []
+
+        def report(result):
+            calls.append(result)
+            if len(calls) == 1:
+                raise RuntimeError('printer failed')
+
+        daemon = productstatus.check.daemon.CheckDaemon(report, None, 3600)
+        with self.assertLogs(level='ERROR'):
+            daemon.refresh()
+        daemon.refresh()
+        daemon.refresh()
+        self.assertEqual(len(calls), 2)
+
+    def test_change_tracker(self):
+        """!
+        @brief Test that the change tracker reports each change once, starting
+        at the latest modification time found in the database, and adds the
+        products of the resources given to it.
+        """
+        data_instance = productstatus.core.models.DataInstance.objects.get(id='ae443952-7990-4cee-9913-41dfd0092dc1')
+        product_id = data_instance.data.product_instance.product_id
+        tracker = productstatus.check.daemon.ChangeTracker()
+        self.assertEqual(tracker.changed_products(), set())
+        self.assertEqual(tracker.changed_products(), set())
+
+        # Modified by a server whose clock is ahead of the daemon
+        modified = productstatus.now_with_timezone() + datetime.timedelta(hours=1)
+        productstatus.core.models.DataInstance.objects.filter(id=data_instance.id).update(modified=modified)
+        self.assertEqual(tracker.changed_products(), set([product_id]))
+        self.assertEqual(tracker.changed_products(), set())
+        self.assertLess(tracker.since, modified)
+
+        data_instance.save()
+        self.assertEqual(tracker.changed_products(), set([product_id]))
+        self.assertEqual(tracker.changed_products([('datainstance', data_instance.id)]), set([product_id]))
+
+    def test_kafka_relevant_resource(self):
+        """!
+        @brief Test that the resources of relevant Kafka messages are found.
+        """
+        relevant_resource = productstatus.check.daemon.KafkaEventWaiter.relevant_resource
+        id = 'ae443952-7990-4cee-9913-41dfd0092dc1'
+        message = {'type': 'resource', 'resource': 'datainstance', 'id': id}
+        self.assertEqual(relevant_resource(json.dumps(message).encode('utf-8')), ('datainstance', uuid.UUID(id)))
+        message['resource'] = 'person'
+        self.assertIsNone(relevant_resource(json.dumps(message).encode('utf-8')))
+        message['type'] = 'heartbeat'
+        self.assertIsNone(relevant_resource(json.dumps(message).encode('utf-8')))
+        self.assertIsNone(relevant_resource(b'{"type": "resource", "resource": "data", "id": "x"}'))
+        self.assertIsNone(relevant_resource(b'[]'))
+        self.assertIsNone(relevant_resource(b'\xff'))
+
+    def test_next_transition(self):
+        """!
+        @brief Test that conditions give the time at which their result will
+        change unless new data arrives.
+        """
+        check = productstatus.check.models.Check.objects.get(pk='8340969c-7f93-4527-8868-a23e3ed80d8b')
+        age = check.checkconditionage_set.all()[0]
+        data_instances = check.checkconditiondatainstance_set.get(pk='032a366f-9bb9-4c98-aa27-97823ca9c7d1')
+        product_instance = check.product.latest_product_instance()
+        delta = productstatus.now_with_timezone() - product_instance.reference_time
+        minutes = (delta.total_seconds() / 60)
+
+        # reference time too old already, or still valid for 10 minutes
+        age.maximum_age = minutes - 10
+        self.assertIsNone(age.next_transition())
+        age.maximum_age = minutes + 10
+        self.assertEqual(age.next_transition(), age.deadline(product_instance))
+
+        # the required data instances are present, the result cannot change
+        data_instances.grace_time = minutes + 20
+        self.assertIsNone(data_instances.next_transition())
+
+        # data instances missing, the grace time runs out in 20 minutes
+        data_instances.count = 2
+        self.assertEqual(data_instances.next_transition(), data_instances.deadline(product_instance))
+        data_instances.grace_time = minutes - 20
+        self.assertIsNone(data_instances.next_transition())
+
+        # not checked for this term
+        data_instances.grace_time = minutes + 20
+        data_instances.terms = '12'
+        self.assertIsNone(data_instances.next_transition())
+
+    def test_daemon_transition(self):
+        """!
+        @brief Test that the check daemon schedules the next transition of
+        each check, and evaluates the check again when it is due.
+        """
+        check = productstatus.check.models.Check.objects.get(pk='8340969c-7f93-4527-8868-a23e3ed80d8b')
+        check.checkconditiondatainstance_set.all().delete()
+        age = check.checkconditionage_set.get()
+        product_instance = check.product.latest_product_instance()
+        delta = productstatus.now_with_timezone() - product_instance.reference_time
+        age.maximum_age = int(delta.total_seconds() / 60) + 10
+        age.save()
+
+        reported = []
+        daemon = productstatus.check.daemon.CheckDaemon(reported.append, None, 3600)
+        daemon.step()
+        self.assertEqual([x.get_code() for x in reported], [productstatus.check.OK])
+        self.assertEqual(daemon.scheduler.next_deadline(), age.deadline(product_instance))
+        self.assertGreater(daemon.timeout(), 500)
+        self.assertLess(daemon.timeout(), 601)
+
+        # let the deadline pass
+        age.maximum_age = int(delta.total_seconds() / 60) - 10
+        age.save()
+        self.assertFalse(daemon.step())
+        daemon.scheduler.schedule(check.pk, productstatus.now_with_timezone())
+        self.assertTrue(daemon.step())
+        self.assertEqual([x.get_code() for x in reported], [productstatus.check.OK, productstatus.check.CRITICAL])
+        self.assertIsNone(daemon.scheduler.next_deadline())
+
+
+class FakeCheck(object):
+    """!
+    Check returning a fixed result after a delay, without using the database.
+    """
+
+    def __init__(self, name, severity, delay):
+        self.name = name
+        self.severity = severity
+        self.delay = delay
+
+    def execute(self, evaluator=None):
+        time.sleep(self.delay)
+        return productstatus.check.SimpleCheckResult(self.severity, self.name)
+
+
+class ParallelCheckTest(django.test.SimpleTestCase):
+    """!
+    Tests for executing checks concurrently.
+    """
+
+    def setUp(self):
+        severities = [productstatus.check.OK, productstatus.check.CRITICAL, productstatus.check.WARNING]
+        self.checks = [FakeCheck('check_%d' % i, severities[i % 3], (8 - i) * 0.002) for i in range(8)]
+
+    def test_execute_checks_order(self):
+        """!
+        @brief Test that checks executed concurrently give the same results in
+        the same order as checks executed serially.
+        """
+        serial = productstatus.check.management.commands.product_check.execute_checks(self.checks)
+        parallel = productstatus.check.management.commands.product_check.execute_checks(self.checks, jobs=4)
+        self.assertEqual([x.check.name for x in parallel], [x.check.name for x in serial])
+        self.assertEqual([x.get_code() for x in parallel], [x.get_code() for x in serial])
+        self.assertEqual([x.get_message() for x in parallel], ['check_%d' % i for i in range(8)])
+
+    def test_execute_checks_exception(self):
+        """!
+        @brief Test that an exception raised by a check is raised again after
+        all checks have been executed.
+        """
+        def fail(evaluator=None):
+            raise RuntimeError('check failed')
+        self.checks[3].execute = fail
+        with self.assertRaisesRegex(RuntimeError, 'check failed'):
+            productstatus.check.management.commands.product_check.execute_checks(self.checks, jobs=4)
+
+
+class DeadlineSchedulerTest(django.test.SimpleTestCase):
+    """!
+    Tests for the deadline scheduler.
+    """
+
+    def setUp(self):
+        self.scheduler = productstatus.check.scheduler.DeadlineScheduler()
+
+    def test_pop_due(self):
+        """!
+        @brief Test that keys are returned in deadline order when due.
+        """
+        self.scheduler.schedule('c', 30)
+        self.scheduler.schedule('a', 10)
+        self.scheduler.schedule('b', 20)
+        self.assertEqual(self.scheduler.next_deadline(), 10)
+        self.assertEqual(self.scheduler.pop_due(5), [])
+        self.assertEqual(self.scheduler.pop_due(20), ['a', 'b'])
+        self.assertEqual(self.scheduler.upcoming(), [(30, 'c')])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_reschedule(self):
+        """!
+        @brief Test that rescheduling a key replaces its deadline, and that
+        cancelled keys are never returned.
+        """
+        self.scheduler.schedule('a', 10)
+        self.scheduler.schedule('b', 20)
+        self.scheduler.schedule('a', 30)
+        self.scheduler.schedule('b', None)
+        self.assertEqual(self.scheduler.next_deadline(), 30)
+        self.assertEqual(self.scheduler.pop_due(100), ['a'])
+        self.assertIsNone(self.scheduler.next_deadline())
+
+    def test_compaction(self):
+        """!
+        @brief Test that stale entries do not accumulate in the heap.
+        """
+        for i in range(1000):
+            self.scheduler.schedule('a', i)
+        self.assertLess(len(self.scheduler.heap), 100)
+        self.assertEqual(self.scheduler.upcoming(), [(999, 'a')])
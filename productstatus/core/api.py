@@ -1,11 +1,27 @@
 from tastypie import fields, resources, authentication, authorization, serializers
+from tastypie.utils import trailing_slash, dict_strip_unicode_keys
+from django.conf.urls import url
 from django.conf import settings
+from django.utils import six
 
 import django.db
+import django.core.exceptions
+import django.http
+import django.utils.cache
+import django.utils.http
 import dateutil.tz
+import calendar
+import datetime
+import hashlib
+import json
+import tastypie.bundle
 import tastypie.exceptions
+import tastypie.http
 
+import productstatus.core.metrics
 import productstatus.core.models
+import productstatus.core.paginator
+import productstatus.core.responsecache
 
 
 class DjangoAuthorization(authorization.DjangoAuthorization):
@@ -25,9 +41,25 @@ class DjangoAuthorization(authorization.DjangoAuthorization):
         return super(DjangoAuthorization, self).read_list(object_list, bundle)
 
 
+def format_datetime_utc(data):
+    """!
+    @brief Format a datetime in UTC the same way as Django's JSON encoder, with
+    millisecond precision and a 'Z' suffix. Naive datetimes are assumed to be
+    in local time.
+    """
+    if data.tzinfo is None or data.utcoffset():
+        data = data.astimezone(tz=dateutil.tz.tzutc())
+    if data.microsecond:
+        return data.isoformat()[:23] + 'Z'
+    return data.isoformat()[:19] + 'Z'
+
+
 class Serializer(serializers.Serializer):
     formats = ['json']
 
+    # Types that are serialized as they are
+    SCALAR_TYPES = frozenset([type(None), bool, int, float] + list(six.string_types))
+
     def format_datetime(self, data):
         """
         Strange behavior: unless this method is overridden, Tastypie will
@@ -35,6 +67,43 @@ class Serializer(serializers.Serializer):
         """
         return data.astimezone(tz=dateutil.tz.tzutc())
 
+    def to_simple(self, data, options):
+        """!
+        @brief Convert data to JSON compatible types in a single pass, looking
+        up the most common types directly, and formatting datetimes as
+        strings. Other types are converted by Tastypie.
+        """
+        data_type = type(data)
+        if data_type in self.SCALAR_TYPES:
+            return data
+        if data_type is tastypie.bundle.Bundle:
+            data = data.data
+            data_type = dict
+        if data_type is dict:
+            result = {}
+            for key, value in data.items():
+                if type(value) in self.SCALAR_TYPES:
+                    result[key] = value
+                elif type(value) is datetime.datetime:
+                    result[key] = format_datetime_utc(value)
+                else:
+                    result[key] = self.to_simple(value, options)
+            return result
+        if data_type is list or data_type is tuple:
+            return [value if type(value) in self.SCALAR_TYPES else self.to_simple(value, options) for value in data]
+        if data_type is datetime.datetime:
+            return format_datetime_utc(data)
+        return super(Serializer, self).to_simple(data, options)
+
+    def to_json(self, data, options=None):
+        """!
+        @brief Serialize data to JSON using the C accelerated encoder of the
+        standard library. The output is identical to that of Tastypie.
+        """
+        options = options or {}
+        with productstatus.core.metrics.timer('serialization'):
+            return json.dumps(self.to_simple(data, options), sort_keys=True, ensure_ascii=False)
+
 
 class BaseResource(resources.ModelResource):
     """
@@ -57,6 +126,446 @@ class BaseResource(resources.ModelResource):
         except django.db.IntegrityError as e:
             raise tastypie.exceptions.BadRequest(e)
 
+    def prepend_urls(self):
+        urls = []
+        if self._meta.allow_bulk:
+            urls += [
+                url(r'^(?P<resource_name>%s)/bulk%s$' % (self._meta.resource_name, trailing_slash()),
+                    self.wrap_view('post_bulk'),
+                    name='api_post_bulk'),
+            ]
+        if self._meta.allow_export:
+            urls += [
+                url(r'^(?P<resource_name>%s)/export\.ndjson$' % self._meta.resource_name,
+                    self.wrap_view('get_export'),
+                    name='api_get_export'),
+            ]
+        return urls
+
+    def get_via_uri(self, uri, request=None):
+        """!
+        @brief Look up related resources only once per request, so that many
+        objects referring to the same resources can be hydrated cheaply.
+        """
+        if request is None:
+            return super(BaseResource, self).get_via_uri(uri, request=request)
+        cache = request.__dict__.setdefault('_productstatus_related_objects', {})
+        key = (self.__class__, uri)
+        if key not in cache:
+            cache[key] = super(BaseResource, self).get_via_uri(uri, request=request)
+        return cache[key]
+
+    def post_bulk(self, request, **kwargs):
+        """!
+        @brief Create or update many objects in a single transaction.
+
+        The request body must be an object with an `objects` list, where each
+        item has the same format as the body of a single POST request. Items
+        with the id of an existing object update that object, all other items
+        are created using a single bulk insert.
+
+        Returns 201 Created with the resource URIs of all objects, in the same
+        order as the request.
+        """
+        self.method_check(request, allowed=['post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        deserialized = self.deserialize(request, request.body, format=request.META.get('CONTENT_TYPE', 'application/json'))
+        if not isinstance(deserialized, dict) or not isinstance(deserialized.get('objects'), list):
+            raise tastypie.exceptions.BadRequest("Bulk requests must contain an 'objects' list.")
+        items = deserialized['objects']
+        if not all([isinstance(item, dict) for item in items]):
+            raise tastypie.exceptions.BadRequest("Bulk request objects must be dictionaries.")
+
+        model = self._meta.object_class
+        try:
+            existing = model.objects.in_bulk([item['id'] for item in items if item.get('id')])
+        except (ValueError, django.core.exceptions.ValidationError) as e:
+            raise tastypie.exceptions.BadRequest(e)
+        existing = dict([(str(key), value) for key, value in existing.items()])
+
+        # Validate all objects before writing anything.
+        bundles = []
+        for item in items:
+            obj = existing.get(str(item.get('id'))) or model()
+            bundle = self.build_bundle(obj=obj, data=dict_strip_unicode_keys(item), request=request)
+            bundle = self.full_hydrate(bundle)
+            self.is_valid(bundle)
+            if bundle.errors:
+                raise tastypie.exceptions.ImmediateHttpResponse(response=self.error_response(request, bundle.errors))
+            if bundle.obj._state.adding:
+                self.authorized_create_detail(self.get_object_list(request), bundle)
+            else:
+                self.authorized_update_detail(self.get_object_list(request), bundle)
+            bundles += [self.hydrate_m2m(bundle)]
+
+        created = [bundle for bundle in bundles if bundle.obj._state.adding]
+        updated = [bundle for bundle in bundles if not bundle.obj._state.adding]
+        try:
+            with django.db.transaction.atomic():
+                model.bulk_insert([bundle.obj for bundle in created])
+                self.bulk_save_m2m(created)
+                for bundle in updated:
+                    bundle.obj.save()
+                    self.save_m2m(bundle)
+        except django.db.IntegrityError as e:
+            raise tastypie.exceptions.BadRequest(e)
+
+        data = {'objects': [self.get_resource_uri(bundle) for bundle in bundles]}
+        return self.create_response(request, data, response_class=tastypie.http.HttpCreated)
+
+    def get_export(self, request, **kwargs):
+        """!
+        @brief Stream all objects matching the request filters as newline
+        delimited JSON, one serialized object per line.
+
+        Objects are read in chunks ordered by primary key, where each chunk
+        starts after the last object of the previous chunk. Memory usage is
+        thus bounded by the chunk size, regardless of the number of objects.
+        """
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+        response = django.http.StreamingHttpResponse(self.export_lines(request, objects),
+                                                     content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="%s.ndjson"' % self._meta.resource_name
+        return response
+
+    def export_chunks(self, objects):
+        """!
+        @brief Iterate over lists of at most API_EXPORT_CHUNK_SIZE objects,
+        using one query per chunk.
+        """
+        objects = objects.order_by('pk')
+        chunk = list(objects[:settings.API_EXPORT_CHUNK_SIZE])
+        while chunk:
+            yield chunk
+            if len(chunk) < settings.API_EXPORT_CHUNK_SIZE:
+                return
+            chunk = list(objects.filter(pk__gt=chunk[-1].pk)[:settings.API_EXPORT_CHUNK_SIZE])
+
+    def export_lines(self, request, objects):
+        serializer = self._meta.serializer
+        for chunk in self.export_chunks(objects):
+            self.prefetch_objects(request, chunk)
+            for obj in chunk:
+                bundle = self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True)
+                yield serializer.to_json(bundle) + '\n'
+
+    def bulk_save_m2m(self, bundles):
+        """!
+        @brief Save related M2M data for newly created objects, using one bulk
+        insert per relation.
+        """
+        for field_name, field_object in self.fields.items():
+            if not field_object.is_m2m or field_object.readonly:
+                continue
+            if not isinstance(field_object.attribute, six.string_types):
+                continue
+            model_field = self._meta.object_class._meta.get_field(field_object.attribute)
+            through = model_field.rel.through
+            through.objects.bulk_create([
+                through(**{
+                    model_field.m2m_field_name(): bundle.obj,
+                    model_field.m2m_reverse_field_name(): related_bundle.obj,
+                })
+                for bundle in bundles
+                for related_bundle in bundle.data.get(field_name) or []
+            ])
+
+    def get_object_list(self, request):
+        """!
+        @brief Return the base queryset of this resource, fetching the objects
+        referred to by its related fields together with the objects
+        themselves, instead of one query per object and field.
+        """
+        qs = super(BaseResource, self).get_object_list(request)
+        field_names = self.get_requested_fields(request)
+        select_related, prefetch_related = self.related_lookups(field_names)
+        if select_related:
+            qs = qs.select_related(*select_related)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+        columns = self.get_requested_columns(request, field_names)
+        if columns is not None:
+            qs = qs.only(*columns)
+        return qs
+
+    def get_requested_fields(self, request):
+        """!
+        @brief Return the names of the fields requested using the `fields`
+        parameter of a GET request, or None if all fields are requested.
+        """
+        if request is None or request.method != 'GET' or not request.GET.get('fields'):
+            return None
+        field_names = set([x.strip() for x in request.GET['fields'].split(',') if x.strip()])
+        unknown = field_names - set(self.fields.keys())
+        if unknown:
+            raise tastypie.exceptions.BadRequest("Unknown fields requested: %s" % ', '.join(sorted(unknown)))
+        field_names.add('resource_uri')
+        return field_names
+
+    def is_field_requested(self, request, field_name):
+        field_names = self.get_requested_fields(request)
+        return field_names is None or field_name in field_names
+
+    def get_requested_columns(self, request, field_names):
+        """!
+        @brief Return the names of the model fields needed for dehydrating
+        the requested fields, or None if all model fields must be loaded.
+
+        Columns are only restricted when every requested field maps directly
+        to a model field, since computed fields may need any of them.
+        """
+        if field_names is None:
+            return None
+        model = self._meta.object_class
+        columns = [model._meta.pk.name]
+        for field_name in field_names - set(['resource_uri']):
+            attribute = self.fields[field_name].attribute
+            if not isinstance(attribute, six.string_types):
+                return None
+            try:
+                model_field = model._meta.get_field(attribute)
+            except django.core.exceptions.FieldDoesNotExist:
+                return None
+            if model_field.many_to_many:
+                continue
+            if not model_field.concrete:
+                return None
+            columns += [model_field.name]
+        if 'cursor' in request.GET:
+            columns += list(self._meta.cursor_fields)
+        return columns + list(self._meta.validator_fields)
+
+    def related_lookups(self, field_names=None):
+        """!
+        @brief Derive select_related and prefetch_related lookups from the
+        related fields declared on this resource, or from the specified
+        subset of them.
+        @returns A tuple of (select_related, prefetch_related) lists.
+        """
+        select_related = []
+        prefetch_related = []
+        model = self._meta.object_class
+        for field_name, field_object in self.fields.items():
+            if field_names is not None and field_name not in field_names:
+                continue
+            if not field_object.is_related or not isinstance(field_object.attribute, six.string_types):
+                continue
+            if field_object.is_m2m:
+                prefetch_related += [field_object.attribute]
+            elif model._meta.get_field(field_object.attribute).is_relation:
+                select_related += [field_object.attribute]
+        return (sorted(select_related), sorted(prefetch_related))
+
+    def prefetch_objects(self, request, objects):
+        """!
+        @brief Hook for computing data for a whole page of objects at once,
+        before they are dehydrated one by one.
+        """
+        pass
+
+    def full_dehydrate(self, bundle, for_list=False):
+        """!
+        @brief Dehydrate the fields requested using the `fields` parameter,
+        or all fields if the parameter is not given.
+
+        This is a copy of Tastypie's implementation, with the addition of the
+        `fields` parameter.
+        """
+        data = bundle.data
+
+        api_name = self._meta.api_name
+        resource_name = self._meta.resource_name
+        field_names = self.get_requested_fields(bundle.request)
+
+        # Dehydrate each field.
+        for field_name, field_object in self.fields.items():
+            if field_names is not None and field_name not in field_names:
+                continue
+
+            # If it's not for use in this mode, skip
+            field_use_in = field_object.use_in
+            if callable(field_use_in):
+                if not field_use_in(bundle):
+                    continue
+            else:
+                if field_use_in not in ['all', 'list' if for_list else 'detail']:
+                    continue
+
+            # A touch leaky but it makes URI resolution work.
+            if field_object.dehydrated_type == 'related':
+                field_object.api_name = api_name
+                field_object.resource_name = resource_name
+
+            data[field_name] = field_object.dehydrate(bundle, for_list=for_list)
+
+            # Check for an optional method to do further dehydration.
+            method = getattr(self, "dehydrate_%s" % field_name, None)
+
+            if method:
+                data[field_name] = method(bundle)
+
+        bundle = self.dehydrate(bundle)
+        return bundle
+
+    def etag_data(self, request, obj):
+        """!
+        @brief Return a list of values that, together with the request query
+        string, determine the representation of an object. Resources with
+        representations depending on other data must extend this list.
+        """
+        return [obj.pk, obj.object_version]
+
+    def get_etag(self, request, objects, meta=None):
+        """!
+        @brief Return an entity tag that changes whenever the representation of
+        the specified objects, and the page metadata of list responses, changes.
+        """
+        data = [self._meta.resource_name, request.GET.urlencode(), meta]
+        data += [self.etag_data(request, obj) for obj in objects]
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get_last_modified(self, request, obj):
+        """!
+        @brief Return the modification time of an object's representation, or
+        None if it cannot be derived from the object alone.
+        """
+        return obj.modified
+
+    def get_not_modified_response(self, request, etag, last_modified=None):
+        """!
+        @brief Return a 304 Not Modified response if the request's
+        conditional headers match the validators, or None otherwise.
+        """
+        timestamp = None
+        if last_modified is not None:
+            timestamp = calendar.timegm(last_modified.utctimetuple())
+        response = django.utils.cache.get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified=None):
+        response['ETag'] = django.utils.http.quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = django.utils.http.http_date(calendar.timegm(last_modified.utctimetuple()))
+
+    def response_cache_key(self, request, etag):
+        return 'api-response:%s:%s:%s' % (self._meta.resource_name, self.determine_format(request), etag)
+
+    def get_cached_response(self, request, etag):
+        """!
+        @brief Return the cached response having the specified entity tag, or
+        None if response caching is not enabled for this resource, or the
+        response is not cached.
+        """
+        if not self._meta.response_cache:
+            return None
+        cache = productstatus.core.responsecache.get_response_cache()
+        if cache is None:
+            return None
+        value = cache.get(self.response_cache_key(request, etag))
+        if value is None:
+            return None
+        content, content_type = value
+        return django.http.HttpResponse(content=content, content_type=content_type)
+
+    def cache_response(self, request, etag, response, objects):
+        """!
+        @brief Store a successful response in the response cache, if enabled
+        for this resource, tagged with the objects it contains.
+        """
+        if not self._meta.response_cache or response.status_code != 200:
+            return
+        cache = productstatus.core.responsecache.get_response_cache()
+        if cache is None:
+            return
+        tags = [productstatus.core.responsecache.object_tag(self._meta.object_class, obj.pk) for obj in objects]
+        cache.set(self.response_cache_key(request, etag), (response.content, response['Content-Type']), tags)
+
+    def get_detail(self, request, **kwargs):
+        """!
+        @brief Returns a single serialized resource.
+
+        This is a copy of Tastypie's implementation, with the addition of the
+        ETag and Last-Modified headers, 304 Not Modified responses to
+        conditional requests, which are checked before dehydration, and the
+        response cache.
+        """
+        basic_bundle = self.build_bundle(request=request)
+
+        try:
+            obj = self.cached_obj_get(bundle=basic_bundle, **self.remove_api_resource_names(kwargs))
+        except django.core.exceptions.ObjectDoesNotExist:
+            return tastypie.http.HttpNotFound()
+        except django.core.exceptions.MultipleObjectsReturned:
+            return tastypie.http.HttpMultipleChoices("More than one resource is found at this URI.")
+
+        etag = self.get_etag(request, [obj])
+        last_modified = self.get_last_modified(request, obj)
+        response = self.get_not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        response = self.get_cached_response(request, etag)
+        if response is None:
+            bundle = self.build_bundle(obj=obj, request=request)
+            bundle = self.full_dehydrate(bundle)
+            bundle = self.alter_detail_data_to_serialize(request, bundle)
+            response = self.create_response(request, bundle)
+            self.cache_response(request, etag, response, [obj])
+        self.set_validators(response, etag, last_modified)
+        return response
+
+    def get_list(self, request, **kwargs):
+        """!
+        @brief Returns a serialized list of resources.
+
+        This is a copy of Tastypie's implementation, with the addition of the
+        prefetch_objects() hook, the `total_count` option of the paginator,
+        keyset pagination when the `cursor` parameter is given, an ETag header
+        computed from the page before dehydration, and the response cache.
+        """
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+
+        if 'cursor' in request.GET:
+            if 'order_by' in request.GET:
+                raise tastypie.exceptions.BadRequest("Ordering is not supported when paginating with a cursor.")
+            paginator = productstatus.core.paginator.CursorPaginator(request.GET, objects, cursor_fields=self._meta.cursor_fields, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+        else:
+            sorted_objects = self.apply_sorting(objects, options=request.GET)
+            paginator = self._meta.paginator_class(request.GET, sorted_objects, total_count=self._meta.total_count, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+        to_be_serialized = paginator.page()
+        page = list(to_be_serialized[self._meta.collection_name])
+        self.prefetch_objects(request, page)
+
+        etag = self.get_etag(request, page, to_be_serialized['meta'])
+        response = self.get_not_modified_response(request, etag)
+        if response is not None:
+            return response
+
+        response = self.get_cached_response(request, etag)
+        if response is None:
+            # Dehydrate the bundles in preparation for serialization.
+            bundles = [
+                self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True)
+                for obj in page
+            ]
+
+            to_be_serialized[self._meta.collection_name] = bundles
+            to_be_serialized = self.alter_list_data_to_serialize(request, to_be_serialized)
+            response = self.create_response(request, to_be_serialized)
+            self.cache_response(request, etag, response, page)
+        self.set_validators(response, etag)
+        return response
+
 
 class BaseMeta:
     """
@@ -68,6 +577,21 @@ class BaseMeta:
     )
     authorization = DjangoAuthorization()
     serializer = Serializer()
+    # Enable the bulk create and update endpoint at <resource>/bulk/
+    allow_bulk = False
+    # Enable the streaming export endpoint at <resource>/export.ndjson
+    allow_export = False
+    # Unique ordering used when paginating with the `cursor` parameter
+    cursor_fields = ('created', 'id',)
+    paginator_class = productstatus.core.paginator.Paginator
+    # How to find the total number of objects in list responses, unless
+    # overridden by the `total_count` parameter: exact, estimate, or none.
+    total_count = productstatus.core.paginator.TOTAL_COUNT_EXACT
+    # Model fields used for computing ETag and Last-Modified headers, which
+    # are always loaded from the database
+    validator_fields = ('object_version', 'modified',)
+    # Cache serialized GET responses, see the API_RESPONSE_CACHE setting
+    response_cache = False
 
 
 class ProductResource(BaseResource):
@@ -77,9 +601,17 @@ class ProductResource(BaseResource):
     contact = fields.ForeignKey('productstatus.core.api.PersonResource', 'contact')
     institution = fields.ForeignKey('productstatus.core.api.InstitutionResource', 'institution')
     license = fields.ForeignKey('productstatus.core.api.LicenseResource', 'license')
+    latest_instance = fields.ForeignKey('productstatus.core.api.ProductInstanceResource', 'latest_instance', null=True, readonly=True)
+    latest_reference_time = fields.DateTimeField(attribute='latest_reference_time', null=True, readonly=True)
+
+    def etag_data(self, request, obj):
+        # The latest instance pointer is updated without saving the product.
+        return super(ProductResource, self).etag_data(request, obj) + [obj.latest_instance_id]
 
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Product.objects.all()
+        validator_fields = BaseMeta.validator_fields + ('latest_instance',)
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'parents': resources.ALL,
@@ -96,8 +628,41 @@ class ProductInstanceResource(BaseResource):
     version = fields.IntegerField(attribute='version')
     complete = fields.DictField(readonly=True, attribute='complete')
 
+    def prefetch_objects(self, request, objects):
+        if self.is_field_requested(request, 'complete'):
+            productstatus.core.models.ProductInstance.prefetch_complete(objects)
+
+    def etag_data(self, request, obj):
+        data = super(ProductInstanceResource, self).etag_data(request, obj)
+        if self.is_field_requested(request, 'complete'):
+            data += [obj.product.file_count, sorted(obj.data_instance_counts().items())]
+        return data
+
+    def get_last_modified(self, request, obj):
+        # Completeness changes when DataInstance resources are added, without
+        # modifying the ProductInstance itself.
+        if self.is_field_requested(request, 'complete'):
+            return None
+        return super(ProductInstanceResource, self).get_last_modified(request, obj)
+
+    def build_filters(self, filters=None, ignore_bad_filters=False):
+        """!
+        @brief Add the `latest` filter, which restricts the list to the latest
+        ProductInstance of each Product. It is combined with any `id__in`
+        filter given by the client.
+        """
+        orm_filters = super(ProductInstanceResource, self).build_filters(filters, ignore_bad_filters)
+        if filters and filters.get('latest') in ['true', 'True', '1']:
+            latest = productstatus.core.models.Product.objects.filter(latest_instance__isnull=False)
+            if 'id__in' in orm_filters:
+                latest = latest.filter(latest_instance__in=orm_filters['id__in'])
+            orm_filters['id__in'] = latest.values('latest_instance')
+        return orm_filters
+
     class Meta(BaseMeta):
         queryset = productstatus.core.models.ProductInstance.objects.all()
+        allow_export = True
+        cursor_fields = ('reference_time', 'version', 'id',)
         filtering = {
             'id': resources.ALL,
             'product': resources.ALL_WITH_RELATIONS,
@@ -116,6 +681,8 @@ class DataResource(BaseResource):
 
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Data.objects.all()
+        allow_bulk = True
+        allow_export = True
         filtering = {
             'id': resources.ALL,
             'productinstance': resources.ALL_WITH_RELATIONS,
@@ -131,6 +698,8 @@ class DataInstanceResource(BaseResource):
 
     class Meta(BaseMeta):
         queryset = productstatus.core.models.DataInstance.objects.all()
+        allow_bulk = True
+        allow_export = True
         filtering = {
             'id': resources.ALL,
             'data': resources.ALL_WITH_RELATIONS,
@@ -152,6 +721,7 @@ class DataInstanceResource(BaseResource):
 class DataFormatResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.DataFormat.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -162,6 +732,7 @@ class DataFormatResource(BaseResource):
 class ServiceBackendResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.ServiceBackend.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -172,6 +743,7 @@ class ServiceBackendResource(BaseResource):
 class VariableResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Variable.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -182,6 +754,7 @@ class VariableResource(BaseResource):
 class PersonResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Person.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -192,6 +765,7 @@ class PersonResource(BaseResource):
 class InstitutionResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Institution.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -202,6 +776,7 @@ class InstitutionResource(BaseResource):
 class ProjectionResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.Projection.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
@@ -212,6 +787,7 @@ class ProjectionResource(BaseResource):
 class LicenseResource(BaseResource):
     class Meta(BaseMeta):
         queryset = productstatus.core.models.License.objects.all()
+        response_cache = True
         filtering = {
             'id': resources.ALL,
             'name': resources.ALL,
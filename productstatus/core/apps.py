@@ -13,17 +13,35 @@ class EventPublisher(AppConfig):
         """
         self.publisher = None
 
-    def send_message(self, message):
+    def get_publisher(self):
         """!
-        @brief Instantiate Kafka publisher if needed, then publish a message about a model instance.
+        @brief Instantiate Kafka publisher if needed, and return it.
         """
-        if settings.TESTING:
-            return
         if not self.publisher:
             self.publisher = productstatus.core.kafkapublisher.KafkaPublisher(
                 settings.KAFKA_BROKERS,
                 settings.KAFKA_CLIENT_ID,
                 settings.KAFKA_TOPIC,
                 settings.KAFKA_REQUEST_TIMEOUT,
+                settings.KAFKA_MAX_BLOCK_TIME,
             )
-        self.publisher.send_message(message)
+        return self.publisher
+
+    def send_message(self, message):
+        """!
+        @brief Instantiate Kafka publisher if needed, then publish a message about a model instance.
+        """
+        if settings.TESTING:
+            return
+        self.get_publisher().send_message(message)
+
+    def send_messages(self, messages):
+        """!
+        @brief Instantiate Kafka publisher if needed, then publish a batch of
+        messages in a single batch.
+        @returns A list of productstatus.core.kafkapublisher.DeliveryResult
+        objects, in the same order as the messages.
+        """
+        if settings.TESTING:
+            return [productstatus.core.kafkapublisher.DeliveryResult(message) for message in messages]
+        return self.get_publisher().send_messages(messages)
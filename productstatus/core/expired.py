@@ -1,23 +1,138 @@
+from django.conf import settings
+
+import django.db
+import django.db.models
+import itertools
+
 import productstatus
 import productstatus.core.models
+import productstatus.core.kafkapublisher
+
+
+def expired_queryset(now):
+    return productstatus.core.models.DataInstance.objects.filter(deleted=False, expires__lte=now)
+
+
+def supports_window_functions(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 25, 0)
+    return False
 
 
-def get_expired_datainstances():
+def get_expired_samples_windowed(connection, now, limit, product_ids):
+    """!
+    @brief Return (product_id, servicebackend_id, datainstance_id) rows of the
+    first `limit` expired DataInstance objects of each group of the specified
+    products, ordered by creation time, using a single query with a window
+    function.
     """
-    Returns a list of expired DataInstance resources, grouped by Product and ServiceBackend.
+    DataInstance = productstatus.core.models.DataInstance
+    Data = productstatus.core.models.Data
+    ProductInstance = productstatus.core.models.ProductInstance
+    query = """
+        SELECT product_id, service_backend_id, id FROM (
+            SELECT pi.product_id, di.service_backend_id, di.id, di.created,
+                   row_number() OVER (PARTITION BY pi.product_id, di.service_backend_id
+                                      ORDER BY di.created, di.id) AS position
+            FROM %(datainstance)s di
+            INNER JOIN %(data)s d ON d.id = di.data_id
+            INNER JOIN %(productinstance)s pi ON pi.id = d.product_instance_id
+            WHERE di.deleted = %%s AND di.expires <= %%s AND pi.product_id IN (%(product_ids)s)
+        ) expired
+        WHERE position <= %%s
+        ORDER BY product_id, service_backend_id, created, id
+    """ % {
+        'datainstance': connection.ops.quote_name(DataInstance._meta.db_table),
+        'data': connection.ops.quote_name(Data._meta.db_table),
+        'productinstance': connection.ops.quote_name(ProductInstance._meta.db_table),
+        'product_ids': ', '.join(['%s'] * len(product_ids)),
+    }
+    to_db = ProductInstance._meta.get_field('product').get_db_prep_value
+    params = [False, connection.ops.adapt_datetimefield_value(now)]
+    params += [to_db(id, connection) for id in product_ids]
+    params += [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def get_expired_samples_limited(now, limit, groups):
+    """!
+    @brief Return the same rows as get_expired_samples_windowed(), using one
+    query per group, on databases without window functions.
+    """
+    rows = []
+    for product_id, servicebackend_id, count in groups:
+        qs = expired_queryset(now).filter(data__product_instance__product=product_id,
+                                          service_backend=servicebackend_id)
+        ids = qs.order_by('created', 'id').values_list('id', flat=True)[:limit]
+        rows += [(product_id, servicebackend_id, id) for id in ids]
+    return rows
+
+
+def get_expired_groups(now):
+    """!
+    @brief Iterate over (product_id, servicebackend_id, count) tuples of the
+    groups of expired DataInstance objects, using a single grouped query.
+    """
+    qs = expired_queryset(now).values('data__product_instance__product', 'service_backend')
+    qs = qs.annotate(count=django.db.models.Count('id'))
+    qs = qs.order_by('data__product_instance__product', 'service_backend')
+    for row in qs.iterator():
+        yield (row['data__product_instance__product'], row['service_backend'], row['count'])
+
+
+def get_expired_chunk(connection, now, limit, groups):
+    """!
+    @brief Return the (product, servicebackend, datainstances, count) tuples
+    of a list of (product_id, servicebackend_id, count) tuples.
+    """
+    if supports_window_functions(connection):
+        rows = get_expired_samples_windowed(connection, now, limit, sorted(set([x[0] for x in groups])))
+    else:
+        rows = get_expired_samples_limited(now, limit, groups)
+
+    # Raw queries return primary keys in their database representation.
+    to_uuid = productstatus.core.models.DataInstance._meta.pk.to_python
+    samples = {}
+    for product_id, servicebackend_id, id in rows:
+        key = (to_uuid(product_id), to_uuid(servicebackend_id),)
+        samples.setdefault(key, [])
+        samples[key] += [to_uuid(id)]
+
+    products = productstatus.core.models.Product.objects.in_bulk(set([x[0] for x in groups]))
+    servicebackends = productstatus.core.models.ServiceBackend.objects.in_bulk(set([x[1] for x in groups]))
+    datainstances = productstatus.core.models.DataInstance.objects.in_bulk(
+        [id for product_id, servicebackend_id, count in groups
+         for id in samples.get((product_id, servicebackend_id), [])])
+    return [(products[product_id],
+             servicebackends[servicebackend_id],
+             [datainstances[x] for x in samples.get((product_id, servicebackend_id), [])],
+             count)
+            for product_id, servicebackend_id, count in groups]
+
+
+def get_expired_datainstances(chunk_size=None):
+    """
+    Iterate over the expired DataInstance resources, grouped by Product and
+    ServiceBackend, as (product, servicebackend, datainstances, count) tuples.
+
+    The groups and their counts are found by a single grouped query. Groups
+    are loaded `chunk_size` groups at a time, defaulting to the
+    EXPIRED_CHUNK_SIZE setting. Only the first EXPIRED_MESSAGE_MAX_URIS
+    DataInstance objects of each group, ordered by creation time, are loaded,
+    using a window function where the database supports it.
     """
-    products = productstatus.core.models.Product.objects.all()
-    servicebackends = productstatus.core.models.ServiceBackend.objects.all()
-    results = []
-    for product in products:
-        for servicebackend in servicebackends:
-            qs = productstatus.core.models.DataInstance.objects.filter(
-                data__product_instance__product=product,
-                service_backend=servicebackend,
-                deleted=False,
-                expires__lte=productstatus.now_with_timezone(),
-            ).order_by('created')
-            if qs.count() == 0:
-                continue
-            results += [(product, servicebackend, list(qs))]
-    return results
+    limit = productstatus.core.kafkapublisher.EXPIRED_MESSAGE_MAX_URIS
+    chunk_size = chunk_size or settings.EXPIRED_CHUNK_SIZE
+    now = productstatus.now_with_timezone()
+    connection = django.db.connections[expired_queryset(now).db]
+    groups = get_expired_groups(now)
+    while True:
+        chunk = list(itertools.islice(groups, chunk_size))
+        if not chunk:
+            return
+        for group in get_expired_chunk(connection, now, limit, chunk):
+            yield group
@@ -6,11 +6,114 @@ import dateutil.tz
 import uuid
 import logging
 import json
+import timeit
 import kafka
 
 
 MESSAGE_PROTOCOL_VERSION = [1, 6, 0]
 
+# Maximum number of resource URIs listed in a message about expired resources
+EXPIRED_MESSAGE_MAX_URIS = 10
+
+
+def acknowledged_count(results):
+    """!
+    @brief Return the number of messages, counted from the start of a batch,
+    that were acknowledged by Kafka. Counting stops at the first failed
+    message, so that callers can preserve message ordering.
+    """
+    count = 0
+    for result in results:
+        if not result.succeeded():
+            break
+        count += 1
+    return count
+
+
+class DeliveryResult(object):
+    """!
+    @brief The outcome of sending a single message to Kafka.
+    """
+
+    def __init__(self, message, record_metadata=None, error=None):
+        self.message = message
+        self.record_metadata = record_metadata
+        self.error = error
+
+    def succeeded(self):
+        return self.error is None
+
+
+class KafkaPipeline(object):
+    """!
+    @brief Submits messages to Kafka without waiting for each of them to be
+    acknowledged, keeping many messages in flight at the same time.
+
+    A pipeline is not thread-safe; use one pipeline per thread.
+    """
+
+    def __init__(self, producer, topic, timeout):
+        """!
+        @param timeout Maximum number of seconds to wait for all submitted
+        messages in wait_all().
+        """
+        self.producer = producer
+        self.topic = topic
+        self.timeout = timeout
+        self.in_flight = []
+        self.submit_failed = False
+
+    def submit(self, msg):
+        """!
+        @brief Submit a json message to Kafka without waiting for it to be sent.
+        Once a message could not be submitted, the following messages are
+        failed without being submitted, so that they are retried in order.
+        @returns The producer future for this message, or None if it could not
+        be submitted.
+        """
+        if self.submit_failed:
+            self.in_flight += [(msg, None, kafka.common.KafkaError('A previous message could not be submitted'))]
+            return None
+        try:
+            future = self.producer.send(self.topic, msg)
+        except kafka.common.KafkaTimeoutError as e:
+            logging.critical("Failed to submit json message to Kafka: %s", e)
+            self.submit_failed = True
+            self.in_flight += [(msg, None, e)]
+            return None
+        self.in_flight += [(msg, future, None)]
+        return future
+
+    def wait_all(self):
+        """!
+        @brief Collect delivery results for all messages submitted since the
+        last call. The whole call takes at most the pipeline timeout; messages
+        not acknowledged by then are failed.
+
+        The producer is not flushed, as a flush would also wait for messages
+        submitted by other threads sharing the producer. Messages are sent as
+        soon as they are submitted, as the producer does not linger.
+        @returns A list of DeliveryResult objects, in submission order.
+        """
+        deadline = timeit.default_timer() + self.timeout
+        results = []
+        for msg, future, error in self.in_flight:
+            if error is not None:
+                results += [DeliveryResult(msg, error=error)]
+                continue
+            try:
+                record_metadata = future.get(timeout=max(0, deadline - timeit.default_timer()))
+            except kafka.common.KafkaError as e:
+                logging.critical("Failed to send json message to Kafka: %s", e)
+                results += [DeliveryResult(msg, error=e)]
+                continue
+            logging.info("Published message to Kafka (topic: %s, partition: %s, offset: %s): %s"
+                         % (record_metadata.topic, record_metadata.partition, record_metadata.offset, msg))
+            results += [DeliveryResult(msg, record_metadata=record_metadata)]
+        self.in_flight = []
+        self.submit_failed = False
+        return results
+
 
 class KafkaPublisher(object):
     """!
@@ -18,11 +121,18 @@ class KafkaPublisher(object):
     or updated resources.
     """
 
-    def __init__(self, brokers, client_id, topic, timeout):
+    def __init__(self, brokers, client_id, topic, timeout, max_block_time=60000):
+        """!
+        @param timeout Maximum number of milliseconds to wait for Kafka to
+        acknowledge a message, or a batch of messages.
+        @param max_block_time Maximum number of milliseconds to block while
+        submitting a message, waiting for metadata or buffer space.
+        """
         self.brokers = brokers
         self.client_id = client_id
         self.topic = topic
-        self.timeout = timeout
+        # Kafka futures take their timeouts in seconds
+        self.timeout = timeout / 1000.0
 
         self.ssl_context = ssl.create_default_context()
         self.ssl_context.protocol = ssl.PROTOCOL_TLSv1_2
@@ -33,6 +143,7 @@ class KafkaPublisher(object):
         self.json_producer = kafka.KafkaProducer(bootstrap_servers=self.brokers,
                                                  client_id=self.client_id,
                                                  acks=1,
+                                                 max_block_ms=max_block_time,
                                                  security_protocol='SSL' if settings.KAFKA_SSL else None,
                                                  ssl_context = self.ssl_context,
                                                  value_serializer=lambda m: json.dumps(m).encode('utf-8'))
@@ -54,6 +165,25 @@ class KafkaPublisher(object):
         logging.info("Published message to Kafka (topic: %s, partition: %s, offset: %s): %s"
                      % (record_metadata.topic, record_metadata.partition, record_metadata.offset, msg))
 
+    def pipeline(self):
+        """!
+        @brief Create a new message pipeline, which can have many messages in
+        flight at the same time.
+        @returns KafkaPipeline
+        """
+        return KafkaPipeline(self.json_producer, self.topic, self.timeout)
+
+    def send_messages(self, messages):
+        """!
+        @brief Send a batch of json messages to Kafka without waiting for each
+        of them, and wait for all of them to be acknowledged.
+        @returns A list of DeliveryResult objects, in the same order as the
+        messages.
+        """
+        pipeline = self.pipeline()
+        [pipeline.submit(msg) for msg in messages]
+        return pipeline.wait_all()
+
     @staticmethod
     def base_message():
         """!
@@ -108,6 +238,6 @@ class KafkaPublisher(object):
             'type': 'expired',
             'product': product.full_uri(),
             'service_backend': service_backend.full_uri(),
-            'uris': [instance.full_uri() for instance in instances[:10]],
+            'uris': [instance.full_uri() for instance in instances[:EXPIRED_MESSAGE_MAX_URIS]],
         })
         return msg
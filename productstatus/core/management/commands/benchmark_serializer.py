@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import datetime
+import decimal
+import timeit
+import uuid
+
+import dateutil.tz
+import tastypie.bundle
+import tastypie.serializers
+
+import productstatus.core.api
+
+
+class ReferenceSerializer(productstatus.core.api.Serializer):
+    """!
+    @brief The API serializer as it was before the single pass conversion,
+    using Tastypie's generic data conversion and JSON encoding.
+    """
+    to_simple = tastypie.serializers.Serializer.to_simple
+    to_json = tastypie.serializers.Serializer.to_json
+
+
+def sample_list_response(count):
+    """!
+    @brief Return a list response resembling a page of DataInstance resources.
+    """
+    now = datetime.datetime(2017, 5, 10, 14, 7, 12, 345678, tzinfo=dateutil.tz.tzutc())
+    objects = []
+    for i in range(count):
+        id = uuid.uuid4()
+        objects += [tastypie.bundle.Bundle(data={
+            'id': str(id),
+            'resource_uri': '/api/v1/datainstance/%s/' % id,
+            'object_version': i,
+            'data': '/api/v1/data/%s/' % uuid.uuid4(),
+            'format': '/api/v1/dataformat/%s/' % uuid.uuid4(),
+            'servicebackend': '/api/v1/servicebackend/%s/' % uuid.uuid4(),
+            'url': 'https://datastore.example.com/%d/file.nc' % i,
+            'partial': False,
+            'deleted': False,
+            'hash': None,
+            'hash_type': None,
+            'expires': now + datetime.timedelta(days=7, seconds=i),
+            'created': now + datetime.timedelta(microseconds=i),
+            'modified': now.replace(microsecond=0),
+            'grid_resolution': decimal.Decimal('2.50000'),
+        })]
+    return {
+        'meta': {'limit': count, 'next': None, 'offset': 0, 'previous': None, 'total_count': count},
+        'objects': objects,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare the speed of the API serializer with the reference Tastypie serializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=1000,
+                            help='Number of objects in the serialized list response')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Number of times to serialize the list response')
+
+    def handle(self, *args, **options):
+        data = sample_list_response(options['objects'])
+        serializers = [
+            ('reference', ReferenceSerializer()),
+            ('productstatus', productstatus.core.api.Serializer()),
+        ]
+
+        outputs = [serializer.to_json(data) for name, serializer in serializers]
+        if outputs[0] != outputs[1]:
+            raise CommandError('Serializer output differs from the reference output')
+
+        timings = {}
+        for name, serializer in serializers:
+            timings[name] = min(timeit.repeat(lambda: serializer.to_json(data), number=1, repeat=options['repeat']))
+            self.stdout.write('%-15s %8.2f ms' % (name, timings[name] * 1000))
+        self.stdout.write('Speedup: %.2fx' % (timings['reference'] / timings['productstatus']))
@@ -7,11 +7,73 @@ import django.db
 import productstatus.core.kafkapublisher
 import productstatus.core.models
 import productstatus.core.expired
+import productstatus.core.notify
 
-import time
+import itertools
 import json
+import uuid
 import logging
 import timeit
+import threading
+
+
+class PublisherWorker(object):
+    """!
+    @brief Drains the pending message queue. Several workers, in this or in
+    other processes, may run concurrently, as each of them claims a disjoint
+    batch of pending messages.
+    """
+
+    def __init__(self, app, batch_size):
+        self.id = uuid.uuid4()
+        self.app = app
+        self.batch_size = batch_size
+        self.waiter = productstatus.core.notify.PendingMessageWaiter()
+
+    def send_pending_batch(self):
+        """!
+        @brief Send up to batch_size pending messages to Kafka in one batch,
+        and delete the messages that were acknowledged by Kafka.
+        @returns A tuple of (claimed, delivered) message counts.
+        """
+        messages = productstatus.core.models.PendingMessage.claim(self.id, self.batch_size)
+        if not messages:
+            return (0, 0)
+        results = self.app.send_messages([json.loads(message.message) for message in messages])
+        delivered = productstatus.core.kafkapublisher.acknowledged_count(results)
+        ids = [message.id for message in messages[:delivered]]
+        productstatus.core.models.PendingMessage.objects.filter(id__in=ids, claimed_by=self.id).delete()
+        productstatus.core.models.PendingMessage.release(self.id, [message.id for message in messages[delivered:]])
+        logging.info('%d messages have been sent and deleted from the pending message queue', delivered)
+        return (len(messages), delivered)
+
+    def send_pending(self):
+        """!
+        @brief Drain the pending message queue in batches. Messages are never
+        deleted before Kafka has acknowledged them; if delivery fails halfway
+        through a batch, the remaining messages are retried on the next pass.
+        @returns The number of messages sent.
+        """
+        total = 0
+        while True:
+            claimed, delivered = self.send_pending_batch()
+            total += delivered
+            if claimed < self.batch_size or delivered < claimed:
+                return total
+
+    def run(self):
+        """!
+        @brief Send pending messages until the process exits.
+        """
+        try:
+            while True:
+                delivered = self.send_pending()
+                self.waiter.wait(delivered > 0, settings.PUBLISHER_POLL_INTERVAL_MAX)
+        except Exception:
+            logging.exception('Publisher worker %s failed', self.id)
+            raise
+        finally:
+            django.db.connection.close()
 
 
 class Command(BaseCommand):
@@ -30,37 +92,71 @@ class Command(BaseCommand):
         self.heartbeat_count += 1
         logging.debug('Sent heartbeat %d', self.heartbeat_count)
 
-    def send_expired_check(self, product, servicebackend, datainstances):
-        msg = productstatus.core.kafkapublisher.KafkaPublisher.expired_message(product, servicebackend, datainstances)
-        self.app.send_message(msg)
-        logging.debug('Sent message about %d expired DataInstance resources in %s, %s', len(datainstances), product, servicebackend)
-
     def send_expired_checks(self):
         expired = productstatus.core.expired.get_expired_datainstances()
-        for ex in expired:
-            self.send_expired_check(*ex)
+        while True:
+            chunk = list(itertools.islice(expired, settings.EXPIRED_CHUNK_SIZE))
+            if not chunk:
+                break
+            messages = [productstatus.core.kafkapublisher.KafkaPublisher.expired_message(*ex[:3]) for ex in chunk]
+            results = self.app.send_messages(messages)
+            for ex, result in zip(chunk, results):
+                product, servicebackend, datainstances, count = ex
+                if not result.succeeded():
+                    logging.error('Failed to send message about expired DataInstance resources in %s, %s', product, servicebackend)
+                    continue
+                logging.debug('Sent message about %d expired DataInstance resources in %s, %s', count, product, servicebackend)
         self.next_expired_checks_time = timeit.default_timer() + settings.EXPIRED_CHECK_INTERVAL
         logging.debug('Sent message about expired DataInstance resources')
 
-    def send_pending(self):
-        messages = productstatus.core.models.PendingMessage.all_pending()
-        for message in messages:
-            with django.db.transaction.atomic():
-                id = message.id
-                message.delete()
-                self.app.send_message(json.loads(message.message))
-            logging.info('Message %s has been sent and deleted from the pending message queue', id)
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PUBLISHER_BATCH_SIZE,
+                            help='Maximum number of pending messages to send to Kafka in a single batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker threads sending pending messages concurrently')
+
+    def start_workers(self, count, batch_size):
+        """!
+        @brief Start additional worker threads, and return the worker that
+        should run in the main thread.
+        """
+        workers = [PublisherWorker(self.app, batch_size) for x in range(count)]
+        self.threads = []
+        for worker in workers[1:]:
+            thread = threading.Thread(target=worker.run, name='publisher-%s' % worker.id)
+            thread.daemon = True
+            thread.start()
+            self.threads += [thread]
+        logging.info('Started %d publisher workers', count)
+        return workers[0]
+
+    def check_workers(self):
+        for thread in self.threads:
+            if not thread.is_alive():
+                raise CommandError('Publisher worker thread %s has died' % thread.name)
 
     def handle(self, *args, **options):
         logging.info('Starting Kafka publisher')
         self.app = django_apps.get_app_config('core')
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size must be a positive integer')
+        if options['workers'] < 1:
+            raise CommandError('Number of workers must be a positive integer')
+        # A worker must have received the answer from Kafka before its lease
+        # on the messages it sends runs out, or another worker could send
+        # them again, possibly out of order.
+        if (settings.KAFKA_MAX_BLOCK_TIME + settings.KAFKA_REQUEST_TIMEOUT) / 1000.0 >= settings.PUBLISHER_LEASE_TIME:
+            raise CommandError('KAFKA_MAX_BLOCK_TIME and KAFKA_REQUEST_TIMEOUT together must be shorter than PUBLISHER_LEASE_TIME')
         self.next_heartbeat_time = 0
         self.next_expired_checks_time = 0
         self.heartbeat_count = 0
+        worker = self.start_workers(options['workers'], options['batch_size'])
         while True:
+            self.check_workers()
             if self.needs_heartbeat():
                 self.send_heartbeat()
             if self.needs_expired_checks():
                 self.send_expired_checks()
-            self.send_pending()
-            time.sleep(1)
+            delivered = worker.send_pending()
+            timeout = min(self.next_heartbeat_time, self.next_expired_checks_time) - timeit.default_timer()
+            worker.waiter.wait(delivered > 0, timeout)
@@ -0,0 +1,162 @@
+"""!
+@brief Per-request performance metrics.
+
+The request metrics middleware measures the number of database queries, the
+time spent in the database, the time spent serializing API responses, and the
+total time of each request. The measurements are returned in the
+Server-Timing response header, and aggregated into per-endpoint histograms
+kept in the memory of the serving process.
+"""
+
+import bisect
+import collections
+import contextlib
+import threading
+import time
+
+
+# Upper bounds of the histogram buckets of durations, in milliseconds
+DURATION_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,)
+
+# Upper bounds of the histogram buckets of query counts
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000,)
+
+
+class RequestMetrics(object):
+    """!
+    @brief Measurements of a single request. Durations are in seconds.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.serialization = 0.0
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def server_timing(self):
+        """!
+        @brief Return the value of the Server-Timing header.
+        """
+        return ', '.join([
+            'db;dur=%.3f;desc="%d queries"' % (self.db * 1000, self.queries),
+            'serialization;dur=%.3f' % (self.serialization * 1000),
+            'total;dur=%.3f' % (self.total * 1000),
+        ])
+
+
+_local = threading.local()
+
+
+def start_request():
+    """!
+    @brief Start measuring a request in the current thread, and return its
+    metrics.
+    """
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def end_request():
+    """!
+    @brief Stop measuring the request in the current thread, and return its
+    metrics, or None if no request was being measured.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    _local.metrics = None
+    if metrics is not None:
+        metrics.finish()
+    return metrics
+
+
+@contextlib.contextmanager
+def timer(name):
+    """!
+    @brief Add the time spent in the context to the named duration of the
+    request being measured in the current thread, if any.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, name, getattr(metrics, name) + time.perf_counter() - start)
+
+
+class Histogram(object):
+    """!
+    @brief Number of observations falling into each of a fixed set of
+    buckets, along with their count, sum and maximum.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'buckets': collections.OrderedDict(zip(bounds, self.counts)),
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'max': round(self.max, 3),
+        }
+
+
+class MetricsRegistry(object):
+    """!
+    @brief Per-endpoint histograms of request metrics.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, metrics):
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = collections.OrderedDict([
+                    ('queries', Histogram(QUERY_COUNT_BUCKETS)),
+                    ('db_ms', Histogram(DURATION_BUCKETS)),
+                    ('serialization_ms', Histogram(DURATION_BUCKETS)),
+                    ('total_ms', Histogram(DURATION_BUCKETS)),
+                ])
+            histograms = self.endpoints[endpoint]
+            histograms['queries'].observe(metrics.queries)
+            histograms['db_ms'].observe(metrics.db * 1000)
+            histograms['serialization_ms'].observe(metrics.serialization * 1000)
+            histograms['total_ms'].observe(metrics.total * 1000)
+
+    def snapshot(self):
+        """!
+        @brief Return the histograms of all endpoints as a dictionary.
+        """
+        with self.lock:
+            return collections.OrderedDict(
+                (endpoint, collections.OrderedDict(
+                    (name, histogram.as_dict()) for name, histogram in histograms.items()
+                ))
+                for endpoint, histograms in sorted(self.endpoints.items())
+            )
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+registry = MetricsRegistry()
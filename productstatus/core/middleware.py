@@ -0,0 +1,91 @@
+import django.db
+import django.db.backends.utils
+import time
+
+import productstatus.core.metrics
+
+
+# Methods of database connections creating the cursors used to run queries
+CURSOR_FACTORIES = ('make_cursor', 'make_debug_cursor',)
+
+
+class QueryMetricsCursorWrapper(django.db.backends.utils.CursorWrapper):
+    """!
+    @brief Cursor adding the number of queries it executes, and the time
+    spent executing them, to the metrics of a request.
+    """
+
+    def __init__(self, cursor, db, metrics):
+        super(QueryMetricsCursorWrapper, self).__init__(cursor, db)
+        self.metrics = metrics
+
+    def measure(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.metrics.queries += 1
+            self.metrics.db += time.perf_counter() - start
+
+    def execute(self, sql, params=None):
+        return self.measure(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self.measure(self.cursor.executemany, sql, param_list)
+
+
+class RequestMetricsMiddleware(object):
+    """!
+    @brief Measure the number of queries, database time, serialization time
+    and total time of each request, return them in the Server-Timing header,
+    and record them in the per-endpoint histograms.
+
+    Queries are measured by wrapping the cursors created by each database
+    connection for the duration of the request, without enabling the query
+    log. This middleware should be the first one in MIDDLEWARE_CLASSES, so
+    that the time spent in the other middleware is included. The body of
+    streaming responses is generated after the measurements are taken.
+    """
+
+    def process_request(self, request):
+        request._metrics = productstatus.core.metrics.start_request()
+        request._metrics_connections = []
+        for connection in django.db.connections.all():
+            request._metrics_connections += [connection]
+            for name in CURSOR_FACTORIES:
+                # Wrappers left behind by a request whose response was not
+                # processed are replaced.
+                connection.__dict__.pop(name, None)
+                setattr(connection, name, self.wrap(getattr(connection, name), connection, request._metrics))
+
+    def wrap(self, make_cursor, connection, metrics):
+        def wrapper(cursor):
+            return QueryMetricsCursorWrapper(make_cursor(cursor), connection, metrics)
+        return wrapper
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_metrics'):
+            return response
+        for connection in request._metrics_connections:
+            for name in CURSOR_FACTORIES:
+                connection.__dict__.pop(name, None)
+        metrics = productstatus.core.metrics.end_request()
+        if metrics is None:
+            return response
+
+        response['Server-Timing'] = metrics.server_timing()
+        productstatus.core.metrics.registry.record(self.get_endpoint(request), metrics)
+        return response
+
+    def get_endpoint(self, request):
+        """!
+        @brief Return the name under which a request is aggregated, made of
+        the request method, the URL pattern name, and the API resource name.
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '%s <unresolved>' % request.method
+        name = match.url_name or match._func_path
+        if 'resource_name' in match.kwargs:
+            name = '%s:%s' % (match.kwargs['resource_name'], name)
+        return '%s %s' % (request.method, name)
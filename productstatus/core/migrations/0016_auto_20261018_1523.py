@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-18 15:23
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_auto_20170510_1407'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingmessage',
+            name='claimed_by',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingmessage',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingmessage',
+            name='partition',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
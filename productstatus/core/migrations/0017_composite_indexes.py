@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Indexes for the most frequent lookups. PostgreSQL gets partial indexes
+# covering only rows that are not deleted. Other databases get composite
+# indexes that include the 'deleted' column instead; notably, SQLite does not
+# use a partial index when the condition is given as a bound parameter.
+#
+# Each entry holds the index name, table name, columns of the index, and
+# columns of the partial index on PostgreSQL, or None for a regular index.
+INDEXES = [
+    # Product.latest_product_instance(), ProductInstance.previous() and next()
+    ('core_productinstance_latest', 'core_productinstance',
+     ['product_id', 'reference_time', 'version'],
+     None),
+    # ProductInstance.data_instances_with_data_format_on_service_backend() and complete()
+    ('core_datainstance_complete', 'core_datainstance',
+     ['service_backend_id', 'format_id', 'deleted', 'data_id'],
+     ['data_id', 'service_backend_id', 'format_id']),
+    # productstatus.core.expired.get_expired_datainstances()
+    ('core_datainstance_expired', 'core_datainstance',
+     ['deleted', 'expires', 'service_backend_id'],
+     ['expires', 'service_backend_id']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    for name, table, columns, partial_columns in INDEXES:
+        partial = postgresql and partial_columns is not None
+        sql = 'CREATE INDEX %s ON %s (%s)' % (
+            quote_name(name),
+            quote_name(table),
+            ', '.join([quote_name(x) for x in (partial_columns if partial else columns)]),
+        )
+        if partial:
+            sql += ' WHERE %s = false' % quote_name('deleted')
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    for name, table, columns, partial_columns in INDEXES:
+        schema_editor.execute('DROP INDEX %s' % schema_editor.quote_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_auto_20261018_1523'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
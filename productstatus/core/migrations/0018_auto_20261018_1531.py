@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-18 15:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_latest_instance(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    ProductInstance = apps.get_model('core', 'ProductInstance')
+    for product in Product.objects.all():
+        latest = ProductInstance.objects.filter(product=product).order_by('-reference_time', '-version').first()
+        if latest is None:
+            continue
+        Product.objects.filter(id=product.id).update(latest_instance=latest,
+                                                     latest_reference_time=latest.reference_time)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='latest_instance',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.ProductInstance'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='latest_reference_time',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_latest_instance, migrations.RunPython.noop),
+    ]
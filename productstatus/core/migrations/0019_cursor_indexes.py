@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Indexes matching the ordering used for keyset pagination in the API. They
+# are not declared with index_together, as altering index_together makes
+# Django rebuild the whole table on SQLite, dropping the indexes created in
+# 0017_composite_indexes.
+INDEXES = [
+    ('core_data_cursor', 'core_data', ['created', 'id']),
+    ('core_datainstance_cursor', 'core_datainstance', ['created', 'id']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    for name, table, columns in INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON %s (%s)' % (
+            quote_name(name),
+            quote_name(table),
+            ', '.join([quote_name(x) for x in columns]),
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    for name, table, columns in INDEXES:
+        schema_editor.execute('DROP INDEX %s' % schema_editor.quote_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_auto_20261018_1531'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
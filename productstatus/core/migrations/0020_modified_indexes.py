@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Indexes used by the check daemon to look up recently modified objects. They
+# are created like the indexes of 0019_cursor_indexes, for the same reason.
+INDEXES = [
+    ('core_productinstance_modified', 'core_productinstance', ['modified']),
+    ('core_datainstance_modified', 'core_datainstance', ['modified']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    for name, table, columns in INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON %s (%s)' % (
+            quote_name(name),
+            quote_name(table),
+            ', '.join([quote_name(x) for x in columns]),
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    for name, table, columns in INDEXES:
+        schema_editor.execute('DROP INDEX %s' % schema_editor.quote_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Index matching the ordering used for keyset pagination of ProductInstance
+# resources in the API, which is not covered by the unique index on
+# (reference_time, product_id, version). It is created like the indexes of
+# 0019_cursor_indexes, for the same reason.
+INDEXES = [
+    ('core_productinstance_cursor', 'core_productinstance', ['reference_time', 'version', 'id']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    quote_name = schema_editor.quote_name
+    for name, table, columns in INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON %s (%s)' % (
+            quote_name(name),
+            quote_name(table),
+            ', '.join([quote_name(x) for x in columns]),
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    for name, table, columns in INDEXES:
+        schema_editor.execute('DROP INDEX %s' % schema_editor.quote_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
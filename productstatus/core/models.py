@@ -9,12 +9,34 @@ from django.db import models
 from django.conf import settings
 
 import django.db
+import django.core.cache
+import django.core.cache.backends.base
+import django.dispatch
 import django.utils.text
 
 import uuid
 import json
+import datetime
+import threading
 
+import productstatus
 import productstatus.core.kafkapublisher
+import productstatus.core.notify
+import productstatus.core.responsecache
+
+
+# PostgreSQL advisory lock key serializing pending message claims
+CLAIM_LOCK_KEY = 0x70736d71
+
+# Serializes pending message claims between threads in this process
+_claim_lock = threading.Lock()
+
+# Product fields maintained by ProductInstance.save()
+LATEST_INSTANCE_FIELDS = ('latest_instance', 'latest_reference_time',)
+
+# Number of times to retry inserting a ProductInstance with a newly allocated
+# version, if the version is taken by a concurrent insert.
+VERSION_ALLOCATION_ATTEMPTS = 5
 
 
 class PendingMessage(models.Model):
@@ -25,11 +47,69 @@ class PendingMessage(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     message = models.TextField()
+    # Messages about the same resource always map to the same partition. A
+    # partition is only processed by one publisher worker at a time, which
+    # preserves message ordering per resource.
+    partition = models.IntegerField(default=0, db_index=True)
+    # Lease held by the publisher worker currently sending this message.
+    claimed_by = models.UUIDField(null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True, db_index=True)
 
     @staticmethod
     def all_pending():
         return PendingMessage.objects.all().order_by('timestamp')
 
+    @staticmethod
+    def partition_for(resource_id):
+        """!
+        @brief Return the partition number for messages about a resource.
+        """
+        return uuid.UUID(str(resource_id)).int % settings.PUBLISHER_PARTITIONS
+
+    @staticmethod
+    def claim(worker_id, limit):
+        """!
+        @brief Lease up to `limit` pending messages to a publisher worker.
+
+        Messages are only claimed from partitions which are not currently
+        leased by any other worker, so that concurrent workers claim disjoint
+        batches without reordering messages about the same resource. Leases
+        expire after PUBLISHER_LEASE_TIME seconds, so that messages claimed by
+        a crashed worker are eventually picked up by another one.
+
+        @returns A list of claimed PendingMessage objects, in queue order.
+        """
+        now = productstatus.now_with_timezone()
+        lease_expiry = now + datetime.timedelta(seconds=settings.PUBLISHER_LEASE_TIME)
+        leased = PendingMessage.objects.filter(claimed_until__gte=now).exclude(claimed_by=worker_id)
+        with _claim_lock, django.db.transaction.atomic():
+            PendingMessage.lock_claims()
+            qs = PendingMessage.all_pending().exclude(partition__in=leased.values('partition'))
+            ids = list(qs.values_list('id', flat=True)[:limit])
+            PendingMessage.objects.filter(id__in=ids).update(claimed_by=worker_id, claimed_until=lease_expiry)
+        return list(PendingMessage.all_pending().filter(id__in=ids, claimed_by=worker_id))
+
+    @staticmethod
+    def lock_claims():
+        """!
+        @brief Serialize claims from concurrent publisher processes until the
+        end of the current transaction.
+        """
+        connection = django.db.connection
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK_KEY])
+
+    @staticmethod
+    def release(worker_id, ids):
+        """!
+        @brief Give up the lease on pending messages, so that they can be
+        claimed again.
+        """
+        qs = PendingMessage.objects.filter(id__in=ids, claimed_by=worker_id)
+        qs.update(claimed_by=None, claimed_until=None)
+
     @staticmethod
     def factory(instance):
         """!
@@ -40,6 +120,7 @@ class PendingMessage(models.Model):
         p = PendingMessage()
         msg = productstatus.core.kafkapublisher.KafkaPublisher.resource_message(instance)
         p.id = uuid.UUID(msg['message_id'])
+        p.partition = PendingMessage.partition_for(msg['id'])
         p.message = json.dumps(msg).encode('utf-8')
         return p
 
@@ -61,11 +142,7 @@ class BaseModel(models.Model):
         that the record will only be saved if a message was successfully
         emitted to Kafka.
         """
-        # Preserve NULL values when writing from the admin interface
-        for var in vars(self):
-            if not var.startswith('_'):
-                if self.__dict__[var] == '':
-                    self.__dict__[var] = None
+        self.normalize_blank_values()
 
         # Write data using a DB transaction
         with django.db.transaction.atomic():
@@ -75,6 +152,36 @@ class BaseModel(models.Model):
                 return
             message = PendingMessage.factory(self)
             message.save()
+            productstatus.core.notify.notify_pending_message(self._state.db)
+            django.db.transaction.on_commit(lambda: productstatus.core.responsecache.invalidate(self))
+
+    @classmethod
+    def bulk_insert(cls, objects):
+        """!
+        @brief Insert many new model instances, and their pending messages,
+        in a single transaction using one bulk insert per table.
+
+        Model save() methods are not called for the inserted instances.
+        """
+        with django.db.transaction.atomic():
+            for obj in objects:
+                obj.normalize_blank_values()
+                obj.object_version += 1
+            cls.objects.bulk_create(objects)
+            messages = [PendingMessage.factory(x) for x in objects if getattr(x, 'deleted', False) is not True]
+            if messages:
+                PendingMessage.objects.bulk_create(messages)
+                productstatus.core.notify.notify_pending_message()
+        return objects
+
+    def normalize_blank_values(self):
+        """!
+        @brief Preserve NULL values when writing from the admin interface.
+        """
+        for var in vars(self):
+            if not var.startswith('_'):
+                if self.__dict__[var] == '':
+                    self.__dict__[var] = None
 
     def slugify(self):
         """!
@@ -104,6 +211,16 @@ class BaseModel(models.Model):
                               self.resource_name(),
                               self.id)
 
+    @classmethod
+    def full_uri_for(cls, id):
+        """!
+        @returns The URI to the resource of this class with the specified
+        primary key, without loading it from the database.
+        """
+        return '%s/%s/%s/' % (settings.PRODUCTSTATUS_BASE_PATH,
+                              cls.__name__.lower(),
+                              id)
+
 
 class Product(BaseModel):
     """
@@ -131,12 +248,25 @@ class Product(BaseModel):
     wdb_data_provider = models.CharField(max_length=255, null=True, blank=True)
     file_count = models.IntegerField(null=True, blank=True)
     source_key = models.CharField(max_length=255, null=True, blank=True)
+    latest_instance = models.ForeignKey('ProductInstance', null=True, blank=True, editable=False,
+                                        on_delete=models.SET_NULL, related_name='+')
+    latest_reference_time = models.DateTimeField(null=True, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True, editable=False)
     modified = models.DateTimeField(auto_now=True, editable=False)
 
     class Meta:
         unique_together = ('source', 'source_key',)
 
+    def save(self, *args, **kwargs):
+        """!
+        @brief Never overwrite the latest instance pointer when saving an
+        existing Product, as it is maintained by ProductInstance.save().
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in LATEST_INSTANCE_FIELDS]
+        return super(Product, self).save(*args, **kwargs)
+
     def product_instances(self):
         """!
         @brief Return a QuerySet with an ordered list of ProductInstance
@@ -149,10 +279,51 @@ class Product(BaseModel):
         @brief Return the latest ProductInstance belonging to this Product, or
         None if there are no ProductInstances found.
         """
-        qs = self.product_instances()
-        if qs.count() > 0:
-            return qs[0]
-        return None
+        if self.latest_instance_id is not None:
+            return self.latest_instance
+        return self.product_instances().first()
+
+    def update_latest_instance(self, product_instance):
+        """!
+        @brief Point latest_instance to the specified ProductInstance, if it
+        is newer than the current latest instance.
+
+        The comparison happens in the database, so that concurrent saves of
+        ProductInstance objects never move the pointer backwards.
+        """
+        if self.latest_instance_id is None:
+            self.refresh_latest_instance()
+        qs = Product.objects.filter(id=self.id).exclude(latest_instance=product_instance.id)
+        qs = qs.filter(latest_instance__isnull=False).filter(
+            models.Q(latest_reference_time__lt=product_instance.reference_time) |
+            models.Q(latest_reference_time=product_instance.reference_time,
+                     latest_instance__version__lt=product_instance.version)
+        )
+        updated = qs.update(latest_instance=product_instance.id,
+                            latest_reference_time=product_instance.reference_time,
+                            modified=productstatus.now_with_timezone())
+        if updated:
+            self.latest_instance = product_instance
+            self.latest_reference_time = product_instance.reference_time
+            django.db.transaction.on_commit(lambda: productstatus.core.responsecache.invalidate(self))
+
+    def refresh_latest_instance(self):
+        """!
+        @brief Point latest_instance to the latest ProductInstance found by an
+        ordered query, if the pointer is not set, e.g. because the latest
+        instance was deleted.
+        """
+        latest = self.product_instances().first()
+        if latest is None:
+            return
+        qs = Product.objects.filter(id=self.id, latest_instance__isnull=True)
+        updated = qs.update(latest_instance=latest.id,
+                            latest_reference_time=latest.reference_time,
+                            modified=productstatus.now_with_timezone())
+        if updated:
+            self.latest_instance = latest
+            self.latest_reference_time = latest.reference_time
+            django.db.transaction.on_commit(lambda: productstatus.core.responsecache.invalidate(self))
 
     def __str__(self):
         return self.name
@@ -178,17 +349,59 @@ class ProductInstance(BaseModel):
         Ensure that the 'version' field remains untouched when saving an
         existing product instance, and auto-increment that field when creating
         a product instance with a reference time and product combination that already exists.
+
+        If a concurrent insert takes the allocated version first, the version
+        is allocated again and the insert retried.
+
+        The latest instance pointer of the Product is updated in the same
+        transaction.
         """
-        existing = ProductInstance.objects.filter(id=self.id)
-        if existing.count() == 1:
-            self.version = existing[0].version
-        elif not self.version:
-            qs = self.similar().order_by('-version')
-            if qs.count() == 0:
-                self.version = 1
-            else:
-                self.version = qs[0].version + 1
-        return super(ProductInstance, self).save(*args, **kwargs)
+        with django.db.transaction.atomic():
+            self.save_version(*args, **kwargs)
+            self.product.update_latest_instance(self)
+
+    def save_version(self, *args, **kwargs):
+        """!
+        @brief Save this ProductInstance, allocating a version number if needed.
+        """
+        existing_version, next_version = self.allocate_version()
+        if existing_version is not None:
+            self.version = existing_version
+            return super(ProductInstance, self).save(*args, **kwargs)
+
+        kwargs['force_insert'] = True
+        if self.version:
+            return super(ProductInstance, self).save(*args, **kwargs)
+
+        for attempt in range(VERSION_ALLOCATION_ATTEMPTS):
+            self.version = next_version
+            try:
+                return super(ProductInstance, self).save(*args, **kwargs)
+            except django.db.IntegrityError:
+                if attempt + 1 == VERSION_ALLOCATION_ATTEMPTS:
+                    raise
+                # Undo changes made by the failed save attempt
+                self.object_version -= 1
+                existing_version, next_version = self.allocate_version()
+
+    def allocate_version(self):
+        """!
+        @brief Look up, using a single query, the stored version of this
+        ProductInstance, and the next free version number for its product and
+        reference time.
+        @returns A tuple of (existing version or None, next free version).
+        """
+        qs = ProductInstance.objects.filter(
+            models.Q(id=self.id) |
+            models.Q(product_id=self.product_id, reference_time=self.reference_time)
+        )
+        existing_version = None
+        next_version = 1
+        for id, version in qs.values_list('id', 'version'):
+            if str(id) == str(self.id):
+                existing_version = version
+            next_version = max(next_version, version + 1)
+        return (existing_version, next_version)
 
     def similar(self):
         """!
@@ -200,39 +413,54 @@ class ProductInstance(BaseModel):
             reference_time=self.reference_time,
         )
 
+    def previous_instances(self):
+        """!
+        @brief Return a QuerySet of ProductInstance objects of the same
+        Product ordered before this one, latest first.
+        """
+        # The redundant upper bound on reference_time lets the database start
+        # an index range scan at this instance, instead of filtering the
+        # whole history of the product.
+        qs = ProductInstance.objects.filter(product_id=self.product_id,
+                                            reference_time__lte=self.reference_time)
+        qs = qs.filter(models.Q(reference_time__lt=self.reference_time) |
+                       models.Q(reference_time=self.reference_time, version__lt=self.version))
+        return qs.order_by('-reference_time', '-version')
+
+    def next_instances(self):
+        """!
+        @brief Return a QuerySet of ProductInstance objects of the same
+        Product ordered after this one, earliest first.
+        """
+        qs = ProductInstance.objects.filter(product_id=self.product_id,
+                                            reference_time__gte=self.reference_time)
+        qs = qs.filter(models.Q(reference_time__gt=self.reference_time) |
+                       models.Q(reference_time=self.reference_time, version__gt=self.version))
+        return qs.order_by('reference_time', 'version')
+
     def previous(self):
         """!
         @brief Return the chronologically previous ProductInstance having the
         same reference time and Product as this ProductInstance, or None if
         there are no previous instance.
+
+        The result is memoized on this object.
         """
-        qs = ProductInstance.objects.filter(
-            product=self.product,
-            reference_time__lte=self.reference_time,
-        )
-        qs = qs.order_by('-reference_time', '-version')
-        for instance in qs:
-            if instance.reference_time == self.reference_time and instance.version >= self.version:
-                continue
-            return instance
-        return None
+        if '_previous' not in self.__dict__:
+            self._previous = self.previous_instances().first()
+        return self._previous
 
     def next(self):
         """!
         @brief Return the chronologically next ProductInstance having the
         same reference time and Product as this ProductInstance, or None if
         there are no next instance.
+
+        The result is memoized on this object.
         """
-        qs = ProductInstance.objects.filter(
-            product=self.product,
-            reference_time__gte=self.reference_time,
-        )
-        qs = qs.order_by('reference_time', 'version')
-        for instance in qs:
-            if instance.reference_time == self.reference_time and instance.version <= self.version:
-                continue
-            return instance
-        return None
+        if '_next' not in self.__dict__:
+            self._next = self.next_instances().first()
+        return self._next
 
     def data_instances(self):
         """!
@@ -280,6 +508,82 @@ class ProductInstance(BaseModel):
         qs = qs.order_by('version', 'data__time_period_begin', 'data__time_period_end')
         return qs
 
+    @staticmethod
+    def complete_cache():
+        """!
+        @brief Return the cache configured by the COMPLETENESS_CACHE setting,
+        or None if completeness is not cached.
+        """
+        if not settings.COMPLETENESS_CACHE:
+            return None
+        return django.core.cache.caches[settings.COMPLETENESS_CACHE['ALIAS']]
+
+    @staticmethod
+    def complete_cache_key_for(id):
+        return 'productinstance-complete-%s' % id
+
+    @staticmethod
+    def invalidate_complete(ids):
+        """!
+        @brief Remove the cached DataInstance counts of ProductInstance
+        objects, both immediately and when the current transaction commits.
+        """
+        cache = ProductInstance.complete_cache()
+        if cache is None:
+            return
+        keys = [ProductInstance.complete_cache_key_for(id) for id in ids]
+        cache.delete_many(keys)
+        django.db.transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @staticmethod
+    def prefetch_complete(product_instances):
+        """!
+        @brief Populate the DataInstance counts used by complete() for a list
+        of ProductInstance objects, using the completeness cache where
+        possible, and a single aggregate query for the rest.
+        """
+        missing = dict([(x.id, x) for x in product_instances if not hasattr(x, '_data_instance_counts')])
+        if not missing:
+            return
+
+        cache = ProductInstance.complete_cache()
+        if cache is not None:
+            cached = cache.get_many([ProductInstance.complete_cache_key_for(id) for id in missing.keys()])
+            for id in list(missing.keys()):
+                key = ProductInstance.complete_cache_key_for(id)
+                if key in cached:
+                    missing.pop(id)._data_instance_counts = cached[key]
+            if not missing:
+                return
+
+        # Service backends and data formats are collected from all data
+        # instances, while only non-deleted data instances are counted.
+        qs = DataInstance.objects.filter(data__product_instance__in=list(missing.keys()))
+        qs = qs.values('data__product_instance', 'service_backend', 'format')
+        qs = qs.annotate(count=models.Sum(models.Case(
+            models.When(deleted=False, then=models.Value(1)),
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        )))
+        counts = dict([(id, {}) for id in missing.keys()])
+        for row in qs.order_by():
+            counts[row['data__product_instance']][(row['service_backend'], row['format'])] = row['count']
+
+        for id, instance in missing.items():
+            instance._data_instance_counts = counts[id]
+        if cache is not None:
+            cache.set_many(dict([(ProductInstance.complete_cache_key_for(id), value) for id, value in counts.items()]),
+                           settings.COMPLETENESS_CACHE.get('TIMEOUT', django.core.cache.backends.base.DEFAULT_TIMEOUT))
+
+    def data_instance_counts(self):
+        """!
+        @brief Return a dictionary mapping (service backend id, data format id)
+        tuples to the number of non-deleted DataInstance objects connected to
+        this ProductInstance.
+        """
+        ProductInstance.prefetch_complete([self])
+        return self._data_instance_counts
+
     def complete(self):
         """!
         @brief Return a list with a nested hash of service backends and data
@@ -287,19 +591,16 @@ class ProductInstance(BaseModel):
         resources belonging to this ProductInstance are present there.
         """
         list_ = {}
-        backends = self.service_backends()
-        formats = self.data_formats()
+        counts = self.data_instance_counts()
+        backends = set([backend for backend, format in counts.keys()])
+        formats = set([format for backend, format in counts.keys()])
         for backend in backends:
-            backend_uri = backend.full_uri()
+            backend_uri = ServiceBackend.full_uri_for(backend)
             list_[backend_uri] = {}
             for format in formats:
-                format_uri = format.full_uri()
+                format_uri = DataFormat.full_uri_for(format)
                 list_[backend_uri][format_uri] = {}
-                instances = self.data_instances_with_data_format_on_service_backend(
-                    format,
-                    backend,
-                )
-                file_count = instances.count()
+                file_count = counts.get((backend, format), 0)
                 is_complete = (self.product.file_count == file_count)
                 list_[backend_uri][format_uri]['file_count'] = is_complete
         return list_
@@ -315,6 +616,17 @@ class ProductInstance(BaseModel):
         }
 
 
+@django.dispatch.receiver(models.signals.post_delete, sender=ProductInstance)
+def product_instance_deleted(sender, instance, **kwargs):
+    """!
+    @brief Point the product to its new latest ProductInstance when its
+    latest instance is deleted, and the pointer has been cleared.
+    """
+    product = Product.objects.filter(id=instance.product_id, latest_instance__isnull=True).first()
+    if product is not None:
+        product.refresh_latest_instance()
+
+
 class Data(BaseModel):
     """
     A set of variables for a specific time period within a single product instance.
@@ -360,6 +672,23 @@ class DataInstance(BaseModel):
     created = models.DateTimeField(auto_now_add=True, editable=False)
     modified = models.DateTimeField(auto_now=True, editable=False)
 
+    def save(self, *args, **kwargs):
+        """!
+        @brief Invalidate the cached completeness of the ProductInstance this
+        DataInstance belongs to.
+        """
+        super(DataInstance, self).save(*args, **kwargs)
+        if ProductInstance.complete_cache() is not None:
+            ProductInstance.invalidate_complete([self.data.product_instance_id])
+
+    @classmethod
+    def bulk_insert(cls, objects):
+        objects = super(DataInstance, cls).bulk_insert(objects)
+        if ProductInstance.complete_cache() is not None:
+            qs = Data.objects.filter(id__in=set([x.data_id for x in objects]))
+            ProductInstance.invalidate_complete(set(qs.values_list('product_instance_id', flat=True)))
+        return objects
+
     def __str__(self):
         return u'%(url)s: %(format)s data file' % {
             'url': self.url,
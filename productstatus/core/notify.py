@@ -0,0 +1,98 @@
+"""!
+@brief Wakeup notifications for the pending message queue.
+
+On PostgreSQL, every transaction that adds a PendingMessage sends a NOTIFY on a
+dedicated channel, and the publisher blocks on that channel until there is
+work to do. Other databases fall back to polling with an adaptive interval.
+"""
+
+from django.conf import settings
+
+import django.db
+
+import select
+import time
+
+
+def notify_pending_message(using=django.db.DEFAULT_DB_ALIAS):
+    """!
+    @brief Wake up any publisher waiting for pending messages. The
+    notification is delivered when the current transaction commits.
+    """
+    connection = django.db.connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('NOTIFY %s' % settings.PENDING_MESSAGE_CHANNEL)
+
+
+class AdaptiveBackoff(object):
+    """!
+    @brief Polling interval that doubles while idle, and resets to its minimum
+    value as soon as there is activity.
+    """
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+    def next_interval(self, activity):
+        """!
+        @brief Return the number of seconds to wait before polling again.
+        @param activity True if the previous poll found any work.
+        """
+        if activity:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+
+class PendingMessageWaiter(object):
+    """!
+    @brief Block until new pending messages might be available.
+    """
+
+    def __init__(self, using=django.db.DEFAULT_DB_ALIAS):
+        self.using = using
+        self.backoff = AdaptiveBackoff(settings.PUBLISHER_POLL_INTERVAL_MIN,
+                                       settings.PUBLISHER_POLL_INTERVAL_MAX)
+        self.listening_connection = None
+
+    def listen(self, connection):
+        """!
+        @brief Subscribe to the notification channel, and return the raw
+        database connection. The subscription is renewed if Django has
+        reconnected to the database in the meantime.
+        """
+        connection.ensure_connection()
+        if self.listening_connection is not connection.connection:
+            with connection.cursor() as cursor:
+                cursor.execute('LISTEN %s' % settings.PENDING_MESSAGE_CHANNEL)
+            self.listening_connection = connection.connection
+        return self.listening_connection
+
+    def wait(self, activity, timeout):
+        """!
+        @brief Wait until new pending messages might be available, or the
+        timeout is reached.
+        @param activity True if the previous pass sent any messages.
+        @param timeout Maximum number of seconds to wait.
+        """
+        connection = django.db.connections[self.using]
+        timeout = max(0, timeout)
+        if connection.vendor != 'postgresql':
+            time.sleep(min(timeout, self.backoff.next_interval(activity)))
+            return
+
+        # Notifications might have arrived while running other queries on
+        # this connection; in that case, do not block at all. When blocking,
+        # poll at the maximum interval as a safety net against lost
+        # notifications.
+        timeout = min(timeout, self.backoff.max_interval)
+        pg_connection = self.listen(connection)
+        if not pg_connection.notifies:
+            if select.select([pg_connection], [], [], timeout) != ([], [], []):
+                pg_connection.poll()
+        del pg_connection.notifies[:]
@@ -0,0 +1,196 @@
+"""!
+@brief Pagination for API collections.
+
+The offset paginator can skip counting the total number of objects, or use
+the query planner's estimate instead.
+
+The cursor paginator implements keyset pagination: instead of an offset, each
+page starts after the position of the last object on the previous page, given
+by an opaque cursor. Pages are fetched with an index range scan, and the total
+number of objects is never counted, so walking through a whole collection
+takes linear time.
+"""
+
+from tastypie.exceptions import BadRequest
+from django.db import models
+
+import django.db
+import django.core.exceptions
+import tastypie.paginator
+import base64
+import binascii
+import json
+
+
+# Accepted values of the `total_count` request parameter
+TOTAL_COUNT_EXACT = 'exact'
+TOTAL_COUNT_ESTIMATE = 'estimate'
+TOTAL_COUNT_NONE = 'none'
+TOTAL_COUNT_MODES = (TOTAL_COUNT_EXACT, TOTAL_COUNT_ESTIMATE, TOTAL_COUNT_NONE,)
+
+
+class Paginator(tastypie.paginator.Paginator):
+    """!
+    @brief Offset paginator where the `total_count` request parameter selects
+    how the total number of objects is found:
+
+    * `exact` counts the objects, like the Tastypie paginator;
+    * `estimate` uses the query planner's row estimate on PostgreSQL when
+      the collection is not filtered, and counts the objects otherwise;
+    * `none` omits the total count from the response.
+
+    Unless the count is exact, the presence of a next page is found by
+    fetching one extra object.
+    """
+
+    def __init__(self, request_data, objects, total_count=TOTAL_COUNT_EXACT, **kwargs):
+        super(Paginator, self).__init__(request_data, objects, **kwargs)
+        self.total_count = total_count
+
+    def get_total_count_mode(self):
+        mode = self.request_data.get('total_count', self.total_count)
+        if mode not in TOTAL_COUNT_MODES:
+            raise BadRequest("Invalid total_count '%s' provided. Please provide one of: %s." % (mode, ', '.join(TOTAL_COUNT_MODES)))
+        return mode
+
+    def get_estimated_count(self):
+        """!
+        @brief Return the planner's estimate of the number of rows in the
+        table, or None if the objects are filtered, or there is no estimate.
+        """
+        if not hasattr(self.objects, 'query') or self.objects.query.where:
+            return None
+        connection = django.db.connections[self.objects.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                           [self.objects.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def page(self):
+        """!
+        @brief Return the requested page of objects, and its metadata.
+        """
+        mode = self.get_total_count_mode()
+        if mode == TOTAL_COUNT_EXACT:
+            return super(Paginator, self).page()
+
+        limit = self.get_limit()
+        offset = self.get_offset()
+        if limit:
+            objects = list(self.get_slice(limit + 1, offset))
+        else:
+            objects = list(self.get_slice(limit, offset))
+        has_next = bool(limit) and len(objects) > limit
+        objects = objects[:limit] if limit else objects
+
+        meta = {
+            'offset': offset,
+            'limit': limit,
+        }
+        if mode == TOTAL_COUNT_ESTIMATE:
+            count = self.get_estimated_count()
+            if count is None:
+                count = self.get_count()
+            # The estimate may lag behind the objects already seen.
+            meta['total_count'] = max(count, offset + len(objects))
+
+        if limit:
+            meta['previous'] = self.get_previous(limit, offset)
+            meta['next'] = self._generate_uri(limit, offset + limit) if has_next else None
+
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
+
+
+class CursorPaginator(tastypie.paginator.Paginator):
+    """!
+    @brief Paginator ordering objects by a unique combination of fields, and
+    returning pages of objects following the position given in the `cursor`
+    request parameter. An empty cursor returns the first page.
+    """
+
+    def __init__(self, request_data, objects, cursor_fields=('created', 'id'), **kwargs):
+        super(CursorPaginator, self).__init__(request_data, objects, **kwargs)
+        self.cursor_fields = cursor_fields
+
+    def model_fields(self):
+        return [self.objects.model._meta.get_field(name) for name in self.cursor_fields]
+
+    def encode_cursor(self, obj):
+        """!
+        @brief Return the cursor pointing to the position of an object.
+        """
+        values = [field.value_to_string(obj) for field in self.model_fields()]
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        """!
+        @brief Return the field values of the position a cursor points to.
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            fields = self.model_fields()
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError('Wrong number of cursor values')
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, TypeError, UnicodeError, binascii.Error, django.core.exceptions.ValidationError):
+            raise BadRequest("Invalid cursor '%s' provided." % cursor)
+
+    def get_position_filter(self, values):
+        """!
+        @brief Return a filter matching all objects ordered after the
+        specified cursor field values.
+
+        The alternatives are AND-ed with a lower bound on the first cursor
+        field, which lets the database use it as the start of an index range
+        scan instead of evaluating the alternatives on every row.
+        """
+        q = models.Q()
+        for i, name in enumerate(self.cursor_fields):
+            term = dict(zip(self.cursor_fields[:i], values[:i]))
+            term[name + '__gt'] = values[i]
+            q |= models.Q(**term)
+        return models.Q(**{self.cursor_fields[0] + '__gte': values[0]}) & q
+
+    def get_next_cursor(self, limit, cursor):
+        if self.resource_uri is None:
+            return None
+        request_params = self.request_data.copy()
+        request_params['limit'] = limit
+        request_params['cursor'] = cursor
+        return '%s?%s' % (self.resource_uri, request_params.urlencode())
+
+    def page(self):
+        """!
+        @brief Return the page of objects following the requested cursor. One
+        extra object is fetched to find out if there is a next page.
+        """
+        limit = self.get_limit()
+        objects = self.objects.order_by(*self.cursor_fields)
+        cursor = self.request_data.get('cursor')
+        if cursor:
+            objects = objects.filter(self.get_position_filter(self.decode_cursor(cursor)))
+        if limit:
+            objects = list(objects[:limit + 1])
+        else:
+            objects = list(objects)
+
+        meta = {
+            'limit': limit,
+            'next': None,
+        }
+        if limit and len(objects) > limit:
+            objects = objects[:limit]
+            meta['next'] = self.get_next_cursor(limit, self.encode_cursor(objects[-1]))
+
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
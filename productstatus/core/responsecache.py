@@ -0,0 +1,140 @@
+"""!
+@brief Server-side cache of serialized API responses.
+
+Responses are cached under their entity tag, which changes whenever the
+object_version of any object in the response changes, so that a cached
+response is never served after the objects in it have been modified, even if
+they were modified by another process. Entries are additionally tagged with
+the objects they contain, so that the local memory backend can evict them as
+soon as one of those objects is saved.
+"""
+
+from django.conf import settings
+
+import django.core.cache
+import django.core.exceptions
+import collections
+import threading
+
+
+class LocalMemoryBackend(object):
+    """!
+    @brief In-process cache holding at most max_entries responses, evicting
+    the least recently used response when full.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.tags = collections.defaultdict(set)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def set(self, key, value, tags=()):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (value, tags)
+            for tag in tags:
+                self.tags[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        """!
+        @brief Remove an entry and its tags. The lock must be held by the caller.
+        """
+        value, tags = self.entries.pop(key)
+        for tag in tags:
+            self.tags[tag].discard(key)
+            if not self.tags[tag]:
+                del self.tags[tag]
+
+    def invalidate(self, tag):
+        """!
+        @brief Remove all entries having the specified tag.
+        """
+        with self.lock:
+            for key in list(self.tags.get(tag, [])):
+                self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+
+class DjangoCacheBackend(object):
+    """!
+    @brief Cache stored in one of the Django caches configured in the CACHES
+    setting, e.g. a file based or memcached cache. The size of the cache is
+    bounded by the cache's own settings. Tags are not tracked, so obsolete
+    responses stay in the cache until they are evicted by the cache itself.
+    """
+
+    def __init__(self, alias, timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return django.core.cache.caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, tags=()):
+        self.cache.set(key, value, self.timeout)
+
+    def invalidate(self, tag):
+        pass
+
+    def clear(self):
+        self.cache.clear()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """!
+    @brief Return the response cache configured by the API_RESPONSE_CACHE
+    setting, or None if response caching is disabled.
+    """
+    global _response_cache
+    config = settings.API_RESPONSE_CACHE
+    if not config:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            if config['BACKEND'] == 'local':
+                _response_cache = LocalMemoryBackend(config['MAX_ENTRIES'])
+            elif config['BACKEND'] == 'django':
+                _response_cache = DjangoCacheBackend(config['ALIAS'], config.get('TIMEOUT'))
+            else:
+                raise django.core.exceptions.ImproperlyConfigured(
+                    "Unknown API response cache backend '%s'" % config['BACKEND'])
+        return _response_cache
+
+
+def object_tag(model, id):
+    """!
+    @brief Return the tag identifying responses containing a model instance.
+    """
+    return (model._meta.concrete_model._meta.model_name, str(id))
+
+
+def invalidate(obj):
+    """!
+    @brief Evict cached responses containing the specified model instance.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cache.invalidate(object_tag(obj.__class__, obj.pk))
@@ -106,7 +106,7 @@ def core_object_mini(object_):
 
 @register.inclusion_tag('check/include/checks.html')
 def product_checks(product):
-    checks = productstatus.check.models.Check.objects.filter(product=product)
+    checks = productstatus.check.models.Check.with_conditions().filter(product=product)
     return {
         'product': product,
         'checks': checks,
@@ -1,10 +1,50 @@
 import json
 import copy
+import datetime
+import django.db.models
 import django.test
 
+import productstatus
+import productstatus.core.responsecache
+
 from tastypie.test import ResourceTestCaseMixin
 
 
+def create_object(model, suffix):
+    """!
+    @brief Create an object of a core model, having new related objects in
+    each of its foreign keys and many-to-many relations, so that it does not
+    share any related objects with other objects.
+    """
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key or not field.editable or (field.has_default() and not field.unique):
+            continue
+        if isinstance(field, django.db.models.ForeignKey):
+            values[field.name] = create_object(field.related_model, '%s-%s' % (field.name, suffix))
+        elif field.null:
+            continue
+        elif isinstance(field, django.db.models.EmailField):
+            values[field.name] = '%s-%s@example.com' % (field.name, suffix)
+        elif isinstance(field, django.db.models.URLField):
+            values[field.name] = 'https://example.com/%s/%s' % (field.name, suffix)
+        elif isinstance(field, django.db.models.CharField):
+            values[field.name] = '%s-%s-%s' % (model._meta.model_name, field.name, suffix)
+        elif isinstance(field, django.db.models.BooleanField):
+            values[field.name] = False
+        elif isinstance(field, django.db.models.DateTimeField):
+            values[field.name] = productstatus.now_with_timezone() - datetime.timedelta(days=1)
+        elif isinstance(field, django.db.models.IntegerField):
+            values[field.name] = 1
+    obj = model(**values)
+    obj.save()
+    for field in model._meta.many_to_many:
+        if field.related_model is model:
+            continue
+        getattr(obj, field.name).add(create_object(field.related_model, '%s-%s' % (field.name, suffix)))
+    return obj
+
+
 class ProductstatusResourceTest(ResourceTestCaseMixin, django.test.TestCase):
     """
     Base test resource that setup attributes and methods common to all
@@ -16,6 +56,11 @@ class ProductstatusResourceTest(ResourceTestCaseMixin, django.test.TestCase):
     def setUp(self):
         super(ProductstatusResourceTest, self).setUp()
 
+        # Cached values may otherwise survive the rollback of earlier tests.
+        response_cache = productstatus.core.responsecache.get_response_cache()
+        if response_cache is not None:
+            response_cache.clear()
+
         self.url_prefix = '/api/v1'
 
         # create_apikey generates an Authorization HTTP header. The key itself
@@ -48,6 +93,9 @@ class BaseTestCases:
             self.base_url = self.url_prefix
             self.post_data = {}
             self.__model_class__ = None
+            # Number of queries needed to get the collection, regardless of
+            # the number of objects in it.
+            self.list_query_count = None
 
         def test_post_collection_with_correct_size(self):
             """
@@ -82,6 +130,26 @@ class BaseTestCases:
             self.assertValidJSONResponse(response)
             self.assertEqual(len(self.unserialize(response)['objects']), self.collection_size)
 
+        def test_get_collection_query_count(self):
+            """
+            Test that getting the collection uses a constant number of queries,
+            instead of querying for related objects one by one, by adding
+            objects having their own related objects.
+            """
+            if self.list_query_count is None:
+                self.skipTest('Query count is not specified for this resource')
+            with self.assertNumQueries(self.list_query_count):
+                response = self.api_client.get(self.base_url, format='json')
+            self.assertValidJSONResponse(response)
+            size = len(self.unserialize(response)['objects'])
+
+            for i in range(3):
+                create_object(self.__model_class__, i)
+            with self.assertNumQueries(self.list_query_count):
+                response = self.api_client.get(self.base_url, format='json')
+            self.assertValidJSONResponse(response)
+            self.assertEqual(len(self.unserialize(response)['objects']), size + 3)
+
     class ProductstatusItemTest(ProductstatusResourceTest):
 
         def setUp(self):
@@ -0,0 +1,99 @@
+from . import ProductstatusResourceTest
+from productstatus.core.models import Product, DataInstance
+
+
+class ConditionalGetTest(ProductstatusResourceTest):
+
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        self.product_url = '/api/v1/product/7d3fe736-5902-44d5-a34c-86f877190523/'
+        self.data_instance = DataInstance.objects.get(id='ae443952-7990-4cee-9913-41dfd0092dc1')
+        self.product_instance_url = '/api/v1/productinstance/%s/' % self.data_instance.data.product_instance_id
+
+    def test_detail_etag(self):
+        """
+        Test that detail responses carry an ETag, which answers conditional
+        requests with 304 Not Modified until the object is saved.
+        """
+        response = self.api_client.get(self.product_url, format='json')
+        self.assertValidJSONResponse(response)
+        etag = response['ETag']
+
+        response = self.api_client.get(self.product_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        Product.objects.get(id='7d3fe736-5902-44d5-a34c-86f877190523').save()
+        response = self.api_client.get(self.product_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertValidJSONResponse(response)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_depends_on_fields(self):
+        """
+        Test that the ETag depends on the query string.
+        """
+        response = self.api_client.get(self.product_url, format='json')
+        response_with_fields = self.api_client.get(self.product_url + '?fields=name', format='json')
+        self.assertNotEqual(response['ETag'], response_with_fields['ETag'])
+
+    def test_detail_last_modified(self):
+        """
+        Test that detail responses carry a Last-Modified header, which answers
+        conditional requests with 304 Not Modified.
+        """
+        response = self.api_client.get(self.product_url, format='json')
+        last_modified = response['Last-Modified']
+        response = self.api_client.get(self.product_url, format='json', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_instance_complete(self):
+        """
+        Test that the ETag of a product instance changes with its
+        completeness, and that Last-Modified is only given when completeness
+        is not part of the response.
+        """
+        response = self.api_client.get(self.product_instance_url, format='json')
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        self.data_instance.deleted = True
+        self.data_instance.save()
+        response = self.api_client.get(self.product_instance_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertValidJSONResponse(response)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.api_client.get(self.product_instance_url + '?fields=version', format='json')
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_list_etag(self):
+        """
+        Test that list responses carry an ETag, which changes when an object
+        on the page is saved.
+        """
+        url = '/api/v1/datainstance/'
+        response = self.api_client.get(url, format='json')
+        self.assertValidJSONResponse(response)
+        etag = response['ETag']
+
+        response = self.api_client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.data_instance.save()
+        response = self.api_client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertValidJSONResponse(response)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_product_instance_complete_other_process(self):
+        """
+        Test that the ETag of a product instance changes with its
+        completeness, even if the data instance is modified without saving
+        it in this process.
+        """
+        response = self.api_client.get(self.product_instance_url, format='json')
+        etag = response['ETag']
+
+        DataInstance.objects.filter(id=self.data_instance.id).update(deleted=True)
+        response = self.api_client.get(self.product_instance_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertValidJSONResponse(response)
+        self.assertNotEqual(response['ETag'], etag)
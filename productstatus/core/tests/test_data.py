@@ -9,6 +9,7 @@ class DataCollectionTest(BaseTestCases.ProductstatusCollectionTest):
 
         self.base_url = "%s%s" % (self.url_prefix, "/data/")
         self.collection_size = 3
+        self.list_query_count = 3
         self.post_data = {
             "variables": [
                 "/api/v1/variable/72a56a36-0567-41f0-bcbe-5ff90c3d79ac/"
@@ -34,6 +35,24 @@ class DataCollectionTest(BaseTestCases.ProductstatusCollectionTest):
                                         )
         self.assertHttpCreated(response)
 
+    def test_post_bulk_with_variables(self):
+        """
+        Test that M2M relations are saved when creating objects in bulk.
+        """
+        items = [self.post_data, {
+            "variables": self.post_data['variables'],
+            "time_period_begin": "2015-11-24T00:00:00Z",
+            "time_period_end": "2015-11-25T00:00:00Z",
+            "productinstance": self.post_data['productinstance'],
+        }]
+        response = self.api_client.post(self.base_url + 'bulk/', format='json',
+                                        data={'objects': items}, authentication=self.api_key_header)
+        self.assertHttpCreated(response)
+        self.assertEqual(Data.objects.count(), self.collection_size + 2)
+        for uri in self.unserialize(response)['objects']:
+            data = Data.objects.get(id=uri.split('/')[-2])
+            self.assertEqual([str(x.id) for x in data.variables.all()], ['72a56a36-0567-41f0-bcbe-5ff90c3d79ac'])
+
 
 class DataItemTest(BaseTestCases.ProductstatusItemTest):
 
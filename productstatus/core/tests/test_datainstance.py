@@ -1,5 +1,8 @@
+import copy
+import json
+
 from . import BaseTestCases
-from productstatus.core.models import DataInstance
+from productstatus.core.models import DataInstance, PendingMessage
 
 
 class DataInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
@@ -9,6 +12,7 @@ class DataInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
 
         self.base_url = "%s%s" % (self.url_prefix, "/datainstance/")
         self.collection_size = 4
+        self.list_query_count = 2
         self.post_data = {
             "expires": "2015-12-28T09:00:00Z",
             "format": "/api/v1/dataformat/4a052f4e-61b8-4a10-9235-11f2dbb31bcc/",
@@ -18,6 +22,93 @@ class DataInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
             }
         self.__model_class__ = DataInstance
 
+    def test_post_bulk(self):
+        """
+        Test that many objects can be created and updated in a single bulk
+        request, and that a message is queued for each of them.
+        """
+        existing = DataInstance.objects.get(id='ae443952-7990-4cee-9913-41dfd0092dc1')
+        items = []
+        for i in range(3):
+            item = copy.copy(self.post_data)
+            item['url'] = 'https://datastore1.example.com/bulk%d.nc' % i
+            items += [item]
+        update = copy.copy(self.post_data)
+        update['id'] = str(existing.id)
+        update['url'] = 'https://datastore1.example.com/updated.nc'
+        items += [update]
+        pending_count = PendingMessage.objects.count()
+
+        response = self.api_client.post(self.base_url + 'bulk/', format='json',
+                                        data={'objects': items}, authentication=self.api_key_header)
+        self.assertHttpCreated(response)
+        uris = self.unserialize(response)['objects']
+        self.assertEqual(len(uris), 4)
+        self.assertEqual(uris[3], '/api/v1/datainstance/%s/' % existing.id)
+        self.assertEqual(DataInstance.objects.count(), self.collection_size + 3)
+        self.assertEqual(PendingMessage.objects.count(), pending_count + 4)
+        self.assertEqual(DataInstance.objects.get(id=existing.id).url, update['url'])
+        for uri, item in zip(uris[:3], items[:3]):
+            instance = DataInstance.objects.get(id=uri.split('/')[-2])
+            self.assertEqual(instance.url, item['url'])
+            self.assertEqual(instance.object_version, 1)
+
+    def test_post_bulk_atomic(self):
+        """
+        Test that no objects are created if any object in a bulk request is invalid.
+        """
+        bogus = copy.copy(self.post_data)
+        bogus['format'] = '/api/v1/dataformat/00000000-0000-0000-0000-000000000000/'
+        response = self.api_client.post(self.base_url + 'bulk/', format='json',
+                                        data={'objects': [self.post_data, bogus]}, authentication=self.api_key_header)
+        self.assertHttpBadRequest(response)
+        self.assertEqual(DataInstance.objects.count(), self.collection_size)
+
+    def test_post_bulk_unauthenticated(self):
+        response = self.api_client.post(self.base_url + 'bulk/', format='json', data={'objects': [self.post_data]})
+        self.assertHttpUnauthorized(response)
+        self.assertEqual(DataInstance.objects.count(), self.collection_size)
+
+    def test_get_collection_with_fields(self):
+        """
+        Test that only the requested fields are returned, without loading
+        related objects.
+        """
+        with self.assertNumQueries(2) as queries:
+            response = self.api_client.get(self.base_url + '?fields=url,expires', format='json')
+        self.assertValidJSONResponse(response)
+        for object_ in self.unserialize(response)['objects']:
+            self.assertEqual(set(object_.keys()), set(['url', 'expires', 'resource_uri']))
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+        self.assertNotIn('"hash"', queries.captured_queries[-1]['sql'])
+
+    def test_get_collection_with_unknown_fields(self):
+        """
+        Test that requesting an unknown field is a client error.
+        """
+        response = self.api_client.get(self.base_url + '?fields=url,foo', format='json')
+        self.assertHttpBadRequest(response)
+
+    def test_export(self):
+        """
+        Test that all objects matching the filters are streamed as newline
+        delimited JSON, in chunks.
+        """
+        response = self.api_client.get(self.base_url + '?limit=0', format='json')
+        expected = self.unserialize(response)['objects']
+        with self.settings(API_EXPORT_CHUNK_SIZE=3):
+            response = self.api_client.get(self.base_url + 'export.ndjson')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        objects = [json.loads(line) for line in lines]
+        self.assertEqual(sorted(objects, key=lambda x: x['id']), sorted(expected, key=lambda x: x['id']))
+
+        response = self.api_client.get(self.base_url + 'export.ndjson?deleted=false&fields=url')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        expected = DataInstance.objects.filter(deleted=False).order_by('id')
+        self.assertEqual([json.loads(line)['url'] for line in lines], [x.url for x in expected])
+
 
 class DataInstanceItemTest(BaseTestCases.ProductstatusItemTest):
 
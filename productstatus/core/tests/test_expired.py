@@ -1,5 +1,11 @@
+import unittest.mock
+import uuid
+
 import django.test
 
+import productstatus.core.kafkapublisher
+import productstatus.core.models
+
 import productstatus.core.expired
 
 
@@ -25,11 +31,68 @@ class ExpiredTest(django.test.TestCase):
             '495bb3be-e327-4840-accf-afefcd411e06',
             ['ae443952-7990-4cee-9913-41dfd0092dc1'],),
         ]
-        expired = productstatus.core.expired.get_expired_datainstances()
+        with self.assertNumQueries(5):
+            expired = list(productstatus.core.expired.get_expired_datainstances())
         self.assertEqual(len(expired), 2)
         for i, item in enumerate(expired):
-            product, servicebackend, instances = item
+            product, servicebackend, instances, count = item
             ids = [str(instance.id) for instance in instances]
             self.assertEqual(str(product.id), table[i][0])
             self.assertEqual(str(servicebackend.id), table[i][1])
             self.assertEqual(ids, table[i][2])
+            self.assertEqual(count, len(table[i][2]))
+
+    def test_expired_chunks(self):
+        """!
+        @brief Test that groups are yielded one chunk at a time, with the same
+        contents as when loaded in a single chunk.
+        """
+        self.add_expired(14)
+        expected = list(productstatus.core.expired.get_expired_datainstances())
+        expired = productstatus.core.expired.get_expired_datainstances(chunk_size=1)
+        with self.assertNumQueries(5):
+            first = next(expired)
+        with self.assertNumQueries(4):
+            rest = list(expired)
+        self.assertEqual([first] + rest, expected)
+
+    def add_expired(self, count):
+        """!
+        @brief Add expired copies of an expired DataInstance, and return the
+        ids of all expired DataInstance objects in its group, in creation order.
+        """
+        data_instance = productstatus.core.models.DataInstance.objects.get(id='ae443952-7990-4cee-9913-41dfd0092dc1')
+        ids = [data_instance.id]
+        for i in range(count):
+            data_instance.id = uuid.uuid4()
+            data_instance.url = 'https://example.com/%d.nc' % i
+            data_instance.save(force_insert=True)
+            ids += [data_instance.id]
+        qs = productstatus.core.models.DataInstance.objects.filter(id__in=ids)
+        return list(qs.order_by('created', 'id').values_list('id', flat=True))
+
+    def assertSampled(self, expired, ids):
+        limit = productstatus.core.kafkapublisher.EXPIRED_MESSAGE_MAX_URIS
+        product, servicebackend, instances, count = expired[1]
+        self.assertEqual(count, len(ids))
+        self.assertEqual([x.id for x in instances], ids[:limit])
+
+    def test_expired_limit(self):
+        """!
+        @brief Test that the count covers the whole group, while only the
+        first DataInstance objects of the group are returned.
+        """
+        ids = self.add_expired(14)
+        with self.assertNumQueries(5):
+            expired = list(productstatus.core.expired.get_expired_datainstances())
+        self.assertSampled(expired, ids)
+
+    def test_expired_without_window_functions(self):
+        """!
+        @brief Test that the same DataInstance objects are returned on
+        databases without window functions.
+        """
+        ids = self.add_expired(14)
+        with unittest.mock.patch('productstatus.core.expired.supports_window_functions', return_value=False):
+            expired = list(productstatus.core.expired.get_expired_datainstances())
+        self.assertSampled(expired, ids)
@@ -0,0 +1,110 @@
+import django.db
+import django.test
+
+import productstatus
+import productstatus.core.models
+import productstatus.core.paginator
+
+
+class IndexTest(django.test.TestCase):
+    """!
+    Tests that the most frequent queries are served by the composite indexes.
+    """
+
+    fixtures = ['core.json']
+
+    def query_plan(self, qs):
+        """!
+        @brief Return the query plan of a queryset as a single string.
+        """
+        sql, params = qs.query.sql_with_params()
+        with django.db.connection.cursor() as cursor:
+            if django.db.connection.vendor == 'postgresql':
+                # The fixture tables are small enough to make sequential scans
+                # cheaper than any index.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+            elif django.db.connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            else:
+                self.skipTest('Query plans are not checked on %s' % django.db.connection.vendor)
+            return '\n'.join([str(row) for row in cursor.fetchall()])
+
+    def test_latest_product_instance(self):
+        """!
+        @brief Test that the latest ProductInstance is looked up using an index.
+        """
+        product = productstatus.core.models.Product.objects.get(id='7d3fe736-5902-44d5-a34c-86f877190523')
+        plan = self.query_plan(product.product_instances()[:1])
+        self.assertIn('core_productinstance_latest', plan)
+
+    def test_previous_next_product_instance(self):
+        """!
+        @brief Test that the previous and next ProductInstance are looked up
+        using an index range starting at the reference time of the instance.
+        """
+        product = productstatus.core.models.Product.objects.get(id='7d3fe736-5902-44d5-a34c-86f877190523')
+        product_instance = product.product_instances()[0]
+        for qs in (product_instance.previous_instances(), product_instance.next_instances()):
+            plan = self.query_plan(qs[:1])
+            self.assertIn('core_productinstance_latest', plan)
+            self.assertRegex(plan, r'reference_time *[<>]=?')
+
+    def test_data_instances_with_data_format_on_service_backend(self):
+        """!
+        @brief Test that DataInstance resources of a ProductInstance are looked
+        up by service backend and data format using an index.
+        """
+        product_instance = productstatus.core.models.ProductInstance.objects.all()[0]
+        qs = product_instance.data_instances_with_data_format_on_service_backend(
+            '4a052f4e-61b8-4a10-9235-11f2dbb31bcc',
+            '495bb3be-e327-4840-accf-afefcd411e06',
+        )
+        # Counted by CheckConditionDataInstance, without ordering
+        plan = self.query_plan(qs.order_by())
+        self.assertIn('core_datainstance_complete', plan)
+
+    def test_expired(self):
+        """!
+        @brief Test that expired DataInstance resources are looked up using an index.
+        """
+        qs = productstatus.core.models.DataInstance.objects.filter(
+            deleted=False,
+            expires__lte=productstatus.now_with_timezone(),
+        )
+        plan = self.query_plan(qs)
+        self.assertIn('core_datainstance_expired', plan)
+
+    def test_modified(self):
+        """!
+        @brief Test that recently modified ProductInstance and DataInstance
+        resources are looked up using an index.
+        """
+        since = productstatus.now_with_timezone()
+        for model in (productstatus.core.models.ProductInstance, productstatus.core.models.DataInstance):
+            plan = self.query_plan(model.objects.filter(modified__gte=since))
+            self.assertIn('%s_modified' % model._meta.db_table, plan)
+
+    def test_cursor_position(self):
+        """!
+        @brief Test that pages following a cursor are looked up using an index
+        range starting at the position of the cursor.
+        """
+        objects = productstatus.core.models.DataInstance.objects.order_by('created', 'id')
+        paginator = productstatus.core.paginator.CursorPaginator({}, objects)
+        values = [objects[0].created, objects[0].id]
+        plan = self.query_plan(objects.filter(paginator.get_position_filter(values))[:10])
+        self.assertIn('core_datainstance_cursor', plan)
+        self.assertRegex(plan, r'created *>=?')
+
+    def test_product_instance_cursor_position(self):
+        """!
+        @brief Test that pages of ProductInstance resources are read in
+        cursor order from an index, without sorting the collection.
+        """
+        objects = productstatus.core.models.ProductInstance.objects.order_by('reference_time', 'version', 'id')
+        paginator = productstatus.core.paginator.CursorPaginator({}, objects, cursor_fields=('reference_time', 'version', 'id'))
+        values = [objects[0].reference_time, objects[0].version, objects[0].id]
+        plan = self.query_plan(objects.filter(paginator.get_position_filter(values))[:10])
+        self.assertIn('core_productinstance_cursor', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
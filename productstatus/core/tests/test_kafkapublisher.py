@@ -1,9 +1,56 @@
+import time
+
 import django.test
+import kafka.common
 
 import productstatus.core.models
 import productstatus.core.kafkapublisher
 
 
+class FakeFuture(object):
+    def __init__(self, value=None, exception=None):
+        self.value = value
+        self.exception = exception
+
+    def get(self, timeout=None):
+        self.timeout = timeout
+        if self.exception:
+            raise self.exception
+        return self.value
+
+
+class SlowFuture(FakeFuture):
+    """!
+    @brief Future that times out after blocking for half of its timeout.
+    """
+
+    def get(self, timeout=None):
+        self.timeout = timeout
+        time.sleep(timeout / 2)
+        raise kafka.common.KafkaTimeoutError()
+
+
+class FakeProducer(object):
+    """!
+    @brief Producer that fails every message containing the key 'fail', times
+    out every message containing the key 'slow', and blocks for too long when
+    submitting messages containing the key 'block'.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, topic, msg):
+        if 'block' in msg:
+            raise kafka.common.KafkaTimeoutError()
+        self.sent += [msg]
+        if 'fail' in msg:
+            return FakeFuture(exception=kafka.common.KafkaError())
+        if 'slow' in msg:
+            return SlowFuture()
+        return FakeFuture(value=type('RecordMetadata', (object,), {'topic': topic, 'partition': 0, 'offset': len(self.sent)})())
+
+
 class KafkaPublisherTest(django.test.TestCase):
 
     fixtures = ['core.json']
@@ -13,3 +60,52 @@ class KafkaPublisherTest(django.test.TestCase):
         event_hash = productstatus.core.kafkapublisher.KafkaPublisher.resource_message(data_instance)
         assert event_hash['uri'] == '/api/v1/datainstance/ae443952-7990-4cee-9913-41dfd0092dc1/'
         assert event_hash['object_version'] == 0
+
+    def test_pipeline_wait_all(self):
+        """!
+        @brief Test that a pipeline keeps all messages in flight, and reports
+        per-message delivery results in submission order.
+        """
+        producer = FakeProducer()
+        pipeline = productstatus.core.kafkapublisher.KafkaPipeline(producer, 'topic', 1)
+        messages = [{'a': 1}, {'fail': 1}, {'b': 1}]
+        futures = [pipeline.submit(msg) for msg in messages]
+        self.assertEqual(len(futures), 3)
+        results = pipeline.wait_all()
+        self.assertEqual([x.message for x in results], messages)
+        self.assertEqual([x.succeeded() for x in results], [True, False, True])
+        self.assertEqual(results[2].record_metadata.offset, 3)
+        self.assertEqual(productstatus.core.kafkapublisher.acknowledged_count(results), 1)
+        self.assertEqual(pipeline.wait_all(), [])
+
+    def test_pipeline_wait_all_deadline(self):
+        """!
+        @brief Test that the pipeline timeout bounds the whole wait for a
+        batch, and not each message separately.
+        """
+        producer = FakeProducer()
+        pipeline = productstatus.core.kafkapublisher.KafkaPipeline(producer, 'topic', 0.2)
+        futures = [pipeline.submit({'slow': i}) for i in range(3)]
+        start = time.time()
+        results = pipeline.wait_all()
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual([x.succeeded() for x in results], [False, False, False])
+        self.assertLessEqual(futures[0].timeout, 0.2)
+        self.assertLess(futures[2].timeout, futures[1].timeout)
+        self.assertLess(futures[1].timeout, futures[0].timeout)
+
+    def test_pipeline_submit_timeout(self):
+        """!
+        @brief Test that messages following a message that could not be
+        submitted are failed without being submitted.
+        """
+        producer = FakeProducer()
+        pipeline = productstatus.core.kafkapublisher.KafkaPipeline(producer, 'topic', 1)
+        messages = [{'a': 1}, {'block': 1}, {'b': 1}]
+        futures = [pipeline.submit(msg) for msg in messages]
+        self.assertIsNone(futures[1])
+        self.assertIsNone(futures[2])
+        self.assertEqual(producer.sent, [{'a': 1}])
+        results = pipeline.wait_all()
+        self.assertEqual([x.succeeded() for x in results], [True, False, False])
+        self.assertEqual(productstatus.core.kafkapublisher.acknowledged_count(results), 1)
@@ -0,0 +1,97 @@
+import django.contrib.auth.models
+import django.db
+import django.test
+
+from . import ProductstatusResourceTest
+
+import productstatus.core.metrics
+
+
+class HistogramTest(django.test.SimpleTestCase):
+
+    def test_observe(self):
+        """!
+        @brief Test that observations are counted in the first bucket whose
+        upper bound they do not exceed.
+        """
+        histogram = productstatus.core.metrics.Histogram((1, 10,))
+        for value in (0, 1, 2, 10, 11, 50):
+            histogram.observe(value)
+        data = histogram.as_dict()
+        self.assertEqual(list(data['buckets'].items()), [('1', 2), ('10', 2), ('+Inf', 2)])
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(data['sum'], 74)
+        self.assertEqual(data['max'], 50)
+
+
+class RequestMetricsTest(ProductstatusResourceTest):
+
+    def setUp(self):
+        super(RequestMetricsTest, self).setUp()
+        productstatus.core.metrics.registry.clear()
+
+    def get_server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric.split(';')[1:])
+            for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing(self):
+        """!
+        @brief Test that API responses carry a Server-Timing header with the
+        number of queries and the time spent in the database, in serialization
+        and in total.
+        """
+        with self.assertNumQueries(3):
+            response = self.api_client.get('/api/v1/data/', format='json')
+        self.assertValidJSONResponse(response)
+        timing = self.get_server_timing(response)
+        self.assertEqual(timing['db'][1], 'desc="3 queries"')
+        self.assertEqual(set(timing.keys()), set(['db', 'serialization', 'total']))
+        self.assertGreater(float(timing['serialization'][0][4:]), 0)
+        self.assertGreater(float(timing['total'][0][4:]), float(timing['serialization'][0][4:]))
+
+    def test_query_log_disabled(self):
+        """!
+        @brief Test that queries are measured without enabling the query log
+        of the database connection.
+        """
+        connection = django.db.connection
+        start = len(connection.queries_log)
+        response = self.api_client.get('/api/v1/data/', format='json')
+        self.assertValidJSONResponse(response)
+        self.assertEqual(self.get_server_timing(response)['db'][1], 'desc="3 queries"')
+        self.assertFalse(connection.force_debug_cursor)
+        self.assertEqual(len(connection.queries_log), start)
+        self.assertNotIn('make_cursor', connection.__dict__)
+
+    def test_endpoint_histograms(self):
+        """!
+        @brief Test that requests are aggregated into per-endpoint histograms.
+        """
+        self.api_client.get('/api/v1/data/', format='json')
+        self.api_client.get('/api/v1/data/', format='json')
+        self.api_client.get('/api/v1/product/7d3fe736-5902-44d5-a34c-86f877190523/', format='json')
+        snapshot = productstatus.core.metrics.registry.snapshot()
+        self.assertEqual(list(snapshot.keys()), [
+            'GET data:api_dispatch_list',
+            'GET product:api_dispatch_detail',
+        ])
+        histograms = snapshot['GET data:api_dispatch_list']
+        self.assertEqual(histograms['total_ms']['count'], 2)
+        self.assertEqual(histograms['queries']['sum'], 6)
+
+    def test_metrics_view(self):
+        """!
+        @brief Test that the metrics are only available to staff users.
+        """
+        self.api_client.get('/api/v1/data/', format='json')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 302)
+
+        django.contrib.auth.models.User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        data = self.unserialize(response)
+        self.assertEqual(data['GET data:api_dispatch_list']['total_ms']['count'], 1)
@@ -0,0 +1,19 @@
+import django.test
+
+import productstatus.core.notify
+
+
+class AdaptiveBackoffTest(django.test.SimpleTestCase):
+
+    def test_backoff(self):
+        """!
+        @brief Test that the polling interval doubles while idle, is capped at
+        its maximum value, and is reset by activity.
+        """
+        backoff = productstatus.core.notify.AdaptiveBackoff(0.5, 3.0)
+        self.assertEqual(backoff.next_interval(False), 1.0)
+        self.assertEqual(backoff.next_interval(False), 2.0)
+        self.assertEqual(backoff.next_interval(False), 3.0)
+        self.assertEqual(backoff.next_interval(False), 3.0)
+        self.assertEqual(backoff.next_interval(True), 0.5)
+        self.assertEqual(backoff.next_interval(False), 1.0)
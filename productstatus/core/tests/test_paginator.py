@@ -0,0 +1,96 @@
+from . import ProductstatusResourceTest
+from productstatus.core.models import DataInstance, ProductInstance
+
+
+class CursorPaginatorTest(ProductstatusResourceTest):
+
+    def walk(self, url, query_count=1):
+        """
+        Follow the next links from the specified URL, and return all objects.
+        """
+        objects = []
+        while url:
+            with self.assertNumQueries(query_count):
+                response = self.api_client.get(url, format='json')
+            self.assertValidJSONResponse(response)
+            content = self.unserialize(response)
+            self.assertNotIn('total_count', content['meta'])
+            objects += content['objects']
+            url = content['meta']['next']
+        return objects
+
+    def test_walk_collection(self):
+        """
+        Test that following cursors returns every object exactly once, in
+        order of creation.
+        """
+        objects = self.walk('/api/v1/datainstance/?cursor=&limit=1')
+        expected = DataInstance.objects.order_by('created', 'id')
+        self.assertEqual([x['id'] for x in objects], [str(x.id) for x in expected])
+
+    def test_walk_collection_with_filter(self):
+        """
+        Test that filters are kept when following cursors, and that product
+        instances are ordered by reference time and version.
+        """
+        product = '7d3fe736-5902-44d5-a34c-86f877190523'
+        objects = self.walk('/api/v1/productinstance/?product=%s&cursor=&limit=2' % product, 2)
+        expected = ProductInstance.objects.filter(product=product).order_by('reference_time', 'version', 'id')
+        self.assertEqual([x['id'] for x in objects], [str(x.id) for x in expected])
+
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor is a client error.
+        """
+        for cursor in ['foo', 'WyJmb28iXQ==']:
+            response = self.api_client.get('/api/v1/datainstance/?cursor=%s' % cursor, format='json')
+            self.assertHttpBadRequest(response)
+
+    def test_cursor_with_order_by(self):
+        """
+        Test that custom ordering is rejected when paginating with a cursor.
+        """
+        response = self.api_client.get('/api/v1/productinstance/?cursor=&order_by=version', format='json')
+        self.assertHttpBadRequest(response)
+
+
+class TotalCountTest(ProductstatusResourceTest):
+
+    def test_total_count_none(self):
+        """
+        Test that the objects are not counted when total_count=none, and that
+        the next page is still found.
+        """
+        with self.assertNumQueries(1):
+            response = self.api_client.get('/api/v1/datainstance/?total_count=none&limit=3', format='json')
+        self.assertValidJSONResponse(response)
+        content = self.unserialize(response)
+        self.assertNotIn('total_count', content['meta'])
+        self.assertEqual(len(content['objects']), 3)
+        self.assertIn('total_count=none', content['meta']['next'])
+
+        response = self.api_client.get(content['meta']['next'], format='json')
+        content = self.unserialize(response)
+        self.assertEqual(len(content['objects']), DataInstance.objects.count() - 3)
+        self.assertIsNone(content['meta']['next'])
+
+    def test_total_count_estimate(self):
+        """
+        Test that an estimated total count is given when total_count=estimate.
+        Filtered collections are always counted exactly.
+        """
+        response = self.api_client.get('/api/v1/productinstance/?total_count=estimate&product=7d3fe736-5902-44d5-a34c-86f877190523', format='json')
+        self.assertValidJSONResponse(response)
+        content = self.unserialize(response)
+        self.assertEqual(content['meta']['total_count'], len(content['objects']))
+
+        response = self.api_client.get('/api/v1/productinstance/?total_count=estimate', format='json')
+        self.assertValidJSONResponse(response)
+        self.assertGreaterEqual(self.unserialize(response)['meta']['total_count'], ProductInstance.objects.count())
+
+    def test_invalid_total_count(self):
+        """
+        Test that an unknown total_count value is a client error.
+        """
+        response = self.api_client.get('/api/v1/datainstance/?total_count=foo', format='json')
+        self.assertHttpBadRequest(response)
@@ -9,6 +9,7 @@ class ProductCollectionTest(BaseTestCases.ProductstatusCollectionTest):
 
         self.base_url = "%s%s" % (self.url_prefix, "/product/")
         self.collection_size = 2
+        self.list_query_count = 3
         self.post_data = {
             "wdb_data_provider": "modelorama_indeed",
             "grid_resolution": "2500.00000",
@@ -1,6 +1,8 @@
 import unittest
 
-from productstatus.core.models import ProductInstance
+import django.test
+
+from productstatus.core.models import Product, ProductInstance, DataInstance
 from . import BaseTestCases
 
 
@@ -12,6 +14,7 @@ class ProductInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
         self.base_url = "%s%s" % (self.url_prefix, '/productinstance/')
         self.detail_url = "%s%s/" % (self.base_url, "88d28ffd-d448-4319-a94e-16889955f94a")
         self.collection_size = 6
+        self.list_query_count = 3
         self.post_data = {
             'product': '/api/v1/product/7d3fe736-5902-44d5-a34c-86f877190523/',
             'state': 0,
@@ -84,6 +87,20 @@ class ProductInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
 
         self.assertTrue(first_version < second_version)
 
+    def test_increment_version_on_conflict(self):
+        """
+        The version should be allocated again if a concurrent insert has
+        taken the allocated version.
+        """
+        existing = ProductInstance.objects.get(id='88d28ffd-d448-4319-a94e-16889955f94a')
+        instance = ProductInstance(product=existing.product, reference_time=existing.reference_time)
+        allocate_version = instance.allocate_version
+        stale = [(None, existing.version)]
+        instance.allocate_version = lambda: stale.pop() if stale else allocate_version()
+        instance.save()
+        self.assertEqual(instance.version, existing.similar().count())
+        self.assertEqual(instance.object_version, 1)
+
     def test_set_version(self):
         """
         Store version field instead of autoincrement when version is specified in the json payload.
@@ -110,6 +127,113 @@ class ProductInstanceCollectionTest(BaseTestCases.ProductstatusCollectionTest):
 
         self.assertEqual(response.status_code, 400)
 
+    def test_latest_instance(self):
+        """
+        The latest instance pointer of the product should only move to newer
+        product instances.
+        """
+        product = Product.objects.get(id='7d3fe736-5902-44d5-a34c-86f877190523')
+        fallback = product.latest_product_instance()
+        self.assertIsNone(product.latest_instance_id)
+
+        self.post_data['reference_time'] = '2020-01-01T00:00:00Z'
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        latest = self._get_instance_from_resource(resp['Location'])
+        self.assertGreater(latest.reference_time, fallback.reference_time)
+
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        latest = self._get_instance_from_resource(resp['Location'])
+        self.assertEqual(latest.version, 2)
+
+        ProductInstance.objects.create(product=product, reference_time=fallback.reference_time)
+        product = Product.objects.get(id=product.id)
+        self.assertEqual(product.latest_instance_id, latest.id)
+        self.assertEqual(product.latest_reference_time, latest.reference_time)
+        with self.assertNumQueries(1):
+            self.assertEqual(product.latest_product_instance(), latest)
+
+        resp = self.api_client.get('/api/v1/product/%s/' % product.id, format='json')
+        self.assertEqual(self.unserialize(resp)['latest_instance'], latest.full_uri())
+
+    def test_latest_filter(self):
+        """
+        Filtering on latest=true should return the latest product instance
+        of each product.
+        """
+        self.post_data['reference_time'] = '2020-01-01T00:00:00Z'
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        query_string = "latest=true&product=7d3fe736-5902-44d5-a34c-86f877190523"
+        resp = self.api_client.get("%s?%s" % (self.base_url, query_string), format='json')
+        self.assertValidJSONResponse(resp)
+        objects = self.unserialize(resp)['objects']
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(objects[0]['reference_time'], '2020-01-01T00:00:00Z')
+
+    def test_latest_filter_with_id_in(self):
+        """
+        Filtering on latest=true should keep any id__in filter.
+        """
+        self.post_data['reference_time'] = '2020-01-01T00:00:00Z'
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        latest = self._get_instance_from_resource(resp['Location'])
+        other = ProductInstance.objects.exclude(id=latest.id)[0]
+        for ids, expected in [([latest.id, other.id], [str(latest.id)]), ([other.id], [])]:
+            query_string = "latest=true&id__in=%s" % ','.join([str(x) for x in ids])
+            resp = self.api_client.get("%s?%s" % (self.base_url, query_string), format='json')
+            self.assertValidJSONResponse(resp)
+            self.assertEqual([x['id'] for x in self.unserialize(resp)['objects']], expected)
+
+    def test_latest_instance_deleted(self):
+        """
+        Deleting the latest instance should move the pointer to the next
+        latest instance, and not to the next product instance saved.
+        """
+        product = Product.objects.get(id='7d3fe736-5902-44d5-a34c-86f877190523')
+        oldest = product.product_instances().last()
+        self.post_data['reference_time'] = '2020-01-01T00:00:00Z'
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        latest = self._get_instance_from_resource(resp['Location'])
+        self.post_data['reference_time'] = '2021-01-01T00:00:00Z'
+        resp = self.api_client.post(self.base_url, format='json', data=self.post_data,
+                                    authentication=self.api_key_header)
+        self._get_instance_from_resource(resp['Location']).delete()
+
+        product = Product.objects.get(id=product.id)
+        self.assertEqual(product.latest_instance_id, latest.id)
+        Product.objects.filter(id=product.id).update(latest_instance=None)
+        oldest.save()
+        product = Product.objects.get(id=product.id)
+        self.assertEqual(product.latest_instance_id, latest.id)
+        self.assertEqual(product.latest_product_instance(), latest)
+
+        query_string = "latest=true&product=%s" % product.id
+        resp = self.api_client.get("%s?%s" % (self.base_url, query_string), format='json')
+        objects = self.unserialize(resp)['objects']
+        self.assertEqual([x['id'] for x in objects], [str(latest.id)])
+
+    def test_get_collection_without_complete(self):
+        """
+        The complete field should not be computed unless it is requested.
+        """
+        with self.assertNumQueries(2):
+            response = self.api_client.get(self.base_url + '?fields=reference_time,version,product', format='json')
+        self.assertValidJSONResponse(response)
+        for object_ in self.unserialize(response)['objects']:
+            self.assertEqual(set(object_.keys()), set(['reference_time', 'version', 'product', 'resource_uri']))
+
+        response = self.api_client.get(self.base_url + '?fields=complete', format='json')
+        self.assertValidJSONResponse(response)
+        for object_ in self.unserialize(response)['objects']:
+            self.assertIn('complete', object_)
+
+    def _get_instance_from_resource(self, url):
+        return ProductInstance.objects.get(id=url.rstrip('/').split('/')[-1])
+
     def _get_version_from_resource(self, url):
         response = self.api_client.get(url, format='json')
 
@@ -147,3 +271,88 @@ class ProductInstanceItemTest(BaseTestCases.ProductstatusItemTest):
                 self.assertIsNone(next_)
                 continue
             self.assertEqual(next_, qs[index + 1])
+
+    def test_previous_next_memoized(self):
+        """!
+        @brief Test that ProductInstance.previous and next use a single query
+        each, and are memoized.
+        """
+        qs = ProductInstance.objects.filter(product__id='7d3fe736-5902-44d5-a34c-86f877190523').order_by('reference_time', 'version')
+        instance = qs[1]
+        with self.assertNumQueries(2):
+            for i in range(3):
+                instance.previous()
+                instance.next()
+
+    def test_complete(self):
+        """!
+        @brief Test that ProductInstance.complete reports, for each combination
+        of service backend and data format, whether the file count is reached.
+        """
+        for instance in ProductInstance.objects.all():
+            expected = {}
+            for backend in instance.service_backends():
+                expected[backend.full_uri()] = {}
+                for format in instance.data_formats():
+                    count = instance.data_instances_with_data_format_on_service_backend(format, backend).count()
+                    expected[backend.full_uri()][format.full_uri()] = {'file_count': count == instance.product.file_count}
+            self.assertEqual(instance.complete(), expected)
+
+    def test_prefetch_complete(self):
+        """!
+        @brief Test that completeness is computed using one query for many
+        product instances, and reflects DataInstance changes made without
+        going through the ORM save path, e.g. by another process.
+        """
+        instances = list(ProductInstance.objects.select_related('product'))
+        with self.assertNumQueries(1):
+            ProductInstance.prefetch_complete(instances)
+            [x.complete() for x in instances]
+
+        data_instance = DataInstance.objects.filter(deleted=False)[0]
+        instance = ProductInstance.objects.get(id=data_instance.data.product_instance_id)
+        counts = instance.data_instance_counts()
+        key = (data_instance.service_backend_id, data_instance.format_id)
+        DataInstance.objects.filter(id=data_instance.id).update(deleted=True)
+        instance = ProductInstance.objects.get(id=instance.id)
+        self.assertEqual(instance.data_instance_counts()[key], counts[key] - 1)
+
+    @django.test.override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'completeness': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'completeness'},
+        },
+        COMPLETENESS_CACHE={'ALIAS': 'completeness', 'TIMEOUT': 60},
+    )
+    def test_prefetch_complete_cached(self):
+        """!
+        @brief Test that completeness is cached, and invalidated when a
+        DataInstance is saved or bulk inserted.
+        """
+        ProductInstance.complete_cache().clear()
+        instances = list(ProductInstance.objects.select_related('product'))
+        with self.assertNumQueries(1):
+            ProductInstance.prefetch_complete(instances)
+        expected = [x.complete() for x in instances]
+
+        instances = list(ProductInstance.objects.select_related('product'))
+        with self.assertNumQueries(0):
+            ProductInstance.prefetch_complete(instances)
+            self.assertEqual([x.complete() for x in instances], expected)
+
+        data_instance = DataInstance.objects.filter(deleted=False)[0]
+        instance = ProductInstance.objects.get(id=data_instance.data.product_instance_id)
+        key = (data_instance.service_backend_id, data_instance.format_id)
+        count = instance.data_instance_counts()[key]
+        data_instance.deleted = True
+        data_instance.save()
+        instance = ProductInstance.objects.get(id=instance.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(instance.data_instance_counts()[key], count - 1)
+
+        copy = DataInstance(data=data_instance.data, format=data_instance.format,
+                            service_backend=data_instance.service_backend, url='file:///copy')
+        DataInstance.bulk_insert([copy])
+        instance = ProductInstance.objects.get(id=instance.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(instance.data_instance_counts()[key], count)
@@ -0,0 +1,100 @@
+import uuid
+import django.core.management
+import django.test
+
+import productstatus.core.models
+import productstatus.core.kafkapublisher
+import productstatus.core.management.commands.publisher
+
+
+class PartialDeliveryApp(object):
+    """!
+    @brief Fake event publisher that only acknowledges a limited number of
+    messages per batch.
+    """
+
+    def __init__(self, acknowledge):
+        self.acknowledge = acknowledge
+        self.batches = []
+
+    def send_messages(self, messages):
+        self.batches += [messages]
+        return [productstatus.core.kafkapublisher.DeliveryResult(message, error=None if i < self.acknowledge else RuntimeError())
+                for i, message in enumerate(messages)]
+
+
+class PublisherTest(django.test.TestCase):
+
+    fixtures = ['core.json']
+
+    def setUp(self):
+        for data_instance in productstatus.core.models.DataInstance.objects.all():
+            data_instance.save()
+        self.pending_count = productstatus.core.models.PendingMessage.objects.count()
+        self.worker = productstatus.core.management.commands.publisher.PublisherWorker(None, 2)
+
+    def test_send_pending_batches(self):
+        """!
+        @brief Test that the pending message queue is drained in batches.
+        """
+        self.worker.app = PartialDeliveryApp(self.worker.batch_size)
+        self.worker.send_pending()
+        self.assertGreater(len(self.worker.app.batches), 1)
+        self.assertEqual(productstatus.core.models.PendingMessage.objects.count(), 0)
+        self.assertEqual(sum([len(x) for x in self.worker.app.batches]), self.pending_count)
+        for batch in self.worker.app.batches:
+            self.assertLessEqual(len(batch), self.worker.batch_size)
+
+    def test_send_pending_keeps_unacknowledged(self):
+        """!
+        @brief Test that messages are not deleted unless Kafka acknowledged them.
+        """
+        self.worker.app = PartialDeliveryApp(1)
+        self.worker.send_pending()
+        self.assertEqual(len(self.worker.app.batches), 1)
+        self.assertEqual(productstatus.core.models.PendingMessage.objects.count(), self.pending_count - 1)
+
+    def test_claim_partitions(self):
+        """!
+        @brief Test that concurrent workers claim disjoint batches, and never
+        claim messages from a partition leased by another worker.
+        """
+        PendingMessage = productstatus.core.models.PendingMessage
+        first = PendingMessage.claim(uuid.uuid4(), 1)
+        self.assertEqual(len(first), 1)
+        second = PendingMessage.claim(uuid.uuid4(), self.pending_count)
+        self.assertNotIn(first[0].partition, [x.partition for x in second])
+        expected = PendingMessage.objects.exclude(partition=first[0].partition).count()
+        self.assertEqual(len(second), expected)
+
+    def test_release(self):
+        """!
+        @brief Test that released messages can be claimed by another worker.
+        """
+        PendingMessage = productstatus.core.models.PendingMessage
+        worker_id = uuid.uuid4()
+        claimed = PendingMessage.claim(worker_id, self.pending_count)
+        self.assertEqual(len(claimed), self.pending_count)
+        self.assertEqual(PendingMessage.claim(uuid.uuid4(), self.pending_count), [])
+        PendingMessage.release(worker_id, [x.id for x in claimed])
+        self.assertEqual(len(PendingMessage.claim(uuid.uuid4(), self.pending_count)), self.pending_count)
+
+    @django.test.override_settings(KAFKA_MAX_BLOCK_TIME=40000, KAFKA_REQUEST_TIMEOUT=30000, PUBLISHER_LEASE_TIME=60)
+    def test_lease_longer_than_timeout(self):
+        """!
+        @brief Test that the publisher refuses to start if sending a batch may
+        take longer than the lease on its messages.
+        """
+        with self.assertRaisesRegex(django.core.management.CommandError, 'PUBLISHER_LEASE_TIME'):
+            django.core.management.call_command('publisher')
+
+    @django.test.override_settings(EXPIRED_CHUNK_SIZE=1)
+    def test_send_expired_checks(self):
+        """!
+        @brief Test that messages about expired DataInstance resources are sent
+        one chunk of groups at a time.
+        """
+        command = productstatus.core.management.commands.publisher.Command()
+        command.app = PartialDeliveryApp(1)
+        command.send_expired_checks()
+        self.assertEqual([[x['type'] for x in batch] for batch in command.app.batches], [['expired'], ['expired']])
@@ -0,0 +1,103 @@
+import unittest.mock
+
+import django.test
+
+import productstatus.core.api
+import productstatus.core.responsecache
+from . import ProductstatusResourceTest
+from productstatus.core.models import DataFormat, ProductInstance
+
+
+class LocalMemoryBackendTest(django.test.SimpleTestCase):
+    """!
+    Tests for the local memory response cache backend.
+    """
+
+    def setUp(self):
+        self.cache = productstatus.core.responsecache.LocalMemoryBackend(2)
+
+    def test_lru_eviction(self):
+        """!
+        @brief Test that the least recently used entry is evicted when the
+        cache is full.
+        """
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(dict(self.cache.tags), {})
+
+    def test_invalidate(self):
+        """!
+        @brief Test that all entries having a tag are evicted.
+        """
+        self.cache.set('a', 1, ['x', 'y'])
+        self.cache.set('b', 2, ['y'])
+        self.cache.invalidate('x')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        self.cache.invalidate('y')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(dict(self.cache.tags), {})
+
+
+class ResponseCacheTest(ProductstatusResourceTest):
+
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        self.data_format = DataFormat.objects.get(id='4a052f4e-61b8-4a10-9235-11f2dbb31bcc')
+        self.url = '/api/v1/dataformat/%s/' % self.data_format.id
+
+    def test_detail_cached(self):
+        """!
+        @brief Test that a cached detail response is returned without
+        dehydrating the object again, until the object is saved.
+        """
+        response = self.api_client.get(self.url, format='json')
+        self.assertValidJSONResponse(response)
+        resource = productstatus.core.api.DataFormatResource
+        with unittest.mock.patch.object(resource, 'full_dehydrate', side_effect=AssertionError):
+            cached = self.api_client.get(self.url, format='json')
+        self.assertValidJSONResponse(cached)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+        self.data_format.name = 'Renamed'
+        self.data_format.save()
+        response = self.api_client.get(self.url, format='json')
+        self.assertEqual(self.unserialize(response)['name'], 'Renamed')
+
+    def test_list_cached(self):
+        """!
+        @brief Test that a cached list response is returned without
+        dehydrating the objects again.
+        """
+        response = self.api_client.get('/api/v1/dataformat/', format='json')
+        resource = productstatus.core.api.DataFormatResource
+        with unittest.mock.patch.object(resource, 'full_dehydrate', side_effect=AssertionError):
+            cached = self.api_client.get('/api/v1/dataformat/', format='json')
+        self.assertEqual(cached.content, response.content)
+
+    def test_invalidate(self):
+        """!
+        @brief Test that cached responses are evicted when an object in them
+        is invalidated.
+        """
+        self.api_client.get(self.url, format='json')
+        self.api_client.get('/api/v1/dataformat/', format='json')
+        cache = productstatus.core.responsecache.get_response_cache()
+        self.assertEqual(len(cache.entries), 2)
+        productstatus.core.responsecache.invalidate(self.data_format)
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_not_cached(self):
+        """!
+        @brief Test that responses of resources without the response_cache
+        option are not cached.
+        """
+        product_instance = ProductInstance.objects.all()[0]
+        self.api_client.get('/api/v1/productinstance/%s/' % product_instance.id, format='json')
+        self.assertEqual(len(productstatus.core.responsecache.get_response_cache().entries), 0)
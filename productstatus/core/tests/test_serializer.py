@@ -0,0 +1,51 @@
+import datetime
+import decimal
+import uuid
+
+import dateutil.tz
+import django.test
+import tastypie.bundle
+
+import productstatus.core.api
+import productstatus.core.management.commands.benchmark_serializer
+
+
+class SerializerTest(django.test.SimpleTestCase):
+    """!
+    Tests for the API serializer.
+    """
+
+    def setUp(self):
+        self.serializer = productstatus.core.api.Serializer()
+        self.reference = productstatus.core.management.commands.benchmark_serializer.ReferenceSerializer()
+
+    def assertSameOutput(self, data):
+        self.assertEqual(self.serializer.to_json(data), self.reference.to_json(data))
+
+    def test_datetimes(self):
+        """!
+        @brief Test that datetimes are formatted like the reference serializer.
+        """
+        utc = dateutil.tz.tzutc()
+        self.assertSameOutput([
+            datetime.datetime(2017, 5, 10, 14, 7, 12, tzinfo=utc),
+            datetime.datetime(2017, 5, 10, 14, 7, 12, 345678, tzinfo=utc),
+            datetime.datetime(2017, 5, 10, 14, 7, 12, 999, tzinfo=utc),
+            datetime.datetime(2017, 5, 10, 14, 7, 12, 345678, tzinfo=dateutil.tz.tzoffset(None, 7200)),
+            datetime.datetime(812, 1, 1, tzinfo=utc),
+            datetime.date(2017, 5, 10),
+        ])
+
+    def test_list_response(self):
+        """!
+        @brief Test that a list response is serialized byte for byte like the
+        reference serializer.
+        """
+        data = productstatus.core.management.commands.benchmark_serializer.sample_list_response(10)
+        data['objects'] += [tastypie.bundle.Bundle(data={
+            'id': uuid.uuid4(),
+            'name': 'Værmelding æøå  ',
+            'values': (1, 2.5, decimal.Decimal('0.1'), None, True),
+            'nested': {'b': [{'c': datetime.datetime(2017, 1, 1, tzinfo=dateutil.tz.tzutc())}], 'a': ''},
+        })]
+        self.assertSameOutput(data)
@@ -1,9 +1,11 @@
+import django.contrib.admin.views.decorators
 import django.http
 import django.shortcuts
 import django.template
 import django.views.generic
 
 import productstatus.core.lookup
+import productstatus.core.metrics
 import productstatus.core.models
 
 
@@ -33,3 +35,12 @@ def categories(request):
             'servicebackends': productstatus.core.models.ServiceBackend.objects.all().order_by('name'),
         },
         context_instance=django.template.RequestContext(request))
+
+
+@django.contrib.admin.views.decorators.staff_member_required
+def metrics(request):
+    """!
+    @brief Return the per-endpoint request metrics histograms of this process
+    as JSON. Only available to staff users.
+    """
+    return django.http.JsonResponse(productstatus.core.metrics.registry.snapshot())
@@ -47,6 +47,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'productstatus.core.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -179,13 +180,66 @@ KAFKA_BROKERS = ['localhost:9092']
 KAFKA_CLIENT_ID = 'productstatus-' + str(uuid.uuid4())
 KAFKA_TOPIC = 'productstatus'
 KAFKA_REQUEST_TIMEOUT = 2000  # milliseconds
+# Maximum time spent blocking while submitting a message to Kafka
+KAFKA_MAX_BLOCK_TIME = 5000  # milliseconds
 KAFKA_SSL = False
 KAFKA_SSL_VERIFY = True
 KAFKA_HEARTBEAT_INTERVAL = 60  # seconds
 
+# Maximum number of pending messages sent to Kafka in a single batch
+PUBLISHER_BATCH_SIZE = 500
+
+# Number of partitions used to preserve message ordering between concurrent
+# publisher workers, and the time a worker may hold on to claimed messages
+# before they can be claimed by another worker. The lease time must be longer
+# than KAFKA_MAX_BLOCK_TIME and KAFKA_REQUEST_TIMEOUT together, which bound the
+# time spent sending a batch.
+PUBLISHER_PARTITIONS = 64
+PUBLISHER_LEASE_TIME = 60  # seconds
+
+# PostgreSQL NOTIFY channel used to wake up the publisher on new pending messages
+PENDING_MESSAGE_CHANNEL = 'productstatus_pending_message'
+
+# Polling interval bounds for the publisher. On PostgreSQL, the maximum interval
+# is only a safety net; on other databases, the interval backs off from the
+# minimum to the maximum while idle.
+PUBLISHER_POLL_INTERVAL_MIN = 0.01  # seconds
+PUBLISHER_POLL_INTERVAL_MAX = 5.0  # seconds
+
 # Interval between checking for expired DataInstance resources
 EXPIRED_CHECK_INTERVAL = 1800  # seconds
 
+# Number of groups of expired DataInstance resources, by Product and
+# ServiceBackend, loaded and sent to Kafka at a time
+EXPIRED_CHUNK_SIZE = 100
+
+# Interval between evaluations of all checks by `product_check --daemon`. In
+# between, only checks of products with new or modified data, and checks whose
+# grace time or maximum age runs out, are evaluated.
+CHECK_DAEMON_REFRESH_INTERVAL = 300  # seconds
+
+# Server-side cache of serialized API responses, for resources having the
+# response_cache option. The 'local' backend is an in-process cache holding at
+# most MAX_ENTRIES responses, evicting the least recently used ones. The
+# 'django' backend uses the cache named ALIAS in CACHES, e.g. a file based or
+# memcached cache, optionally expiring responses after TIMEOUT seconds. Set to
+# None to disable the response cache.
+API_RESPONSE_CACHE = {
+    'BACKEND': 'local',
+    'MAX_ENTRIES': 10000,
+}
+
+# Cache of the DataInstance counts behind the completeness of ProductInstance
+# resources, stored in the cache named ALIAS in CACHES, and expiring after
+# TIMEOUT seconds. The cache must be shared by all processes, e.g. a memcached
+# cache, as counts are only removed from the cache of the process saving a
+# DataInstance. Set to None to compute completeness on every request.
+COMPLETENESS_CACHE = None
+
+# Number of objects read from the database at a time by the streaming export
+# endpoints of the API
+API_EXPORT_CHUNK_SIZE = 1000
+
 # Frontend date/time format
 DATETIME_FORMAT = 'Y-m-d H:i:s\Z'
 
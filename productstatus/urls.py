@@ -38,6 +38,7 @@ urlpatterns = [
     url(r'^$', productstatus.core.views.root),
     url(r'^explore/', productstatus.core.views.explore, name='explore'),
     url(r'^categories/', productstatus.core.views.categories, name='categories'),
+    url(r'^metrics/', productstatus.core.views.metrics, name='metrics'),
     url(r'^admin/', include(admin.site.urls)),
     url(r'^api/', include(v1_api.urls)),
 ]